@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import threading
+from Queue import Queue
+
+import numpy as np
+
+"""Writes .npz checkpoints in a background thread."""
+class CheckpointWriter(object):
+    def __init__(self, max_pending=2):
+        # write() blocks when this many snapshots are waiting
+        self.__queue  = Queue(maxsize=max_pending)
+        self.__error  = None
+        self.__thread = threading.Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def __run(self):
+        while True:
+            job = self.__queue.get()
+            try:
+                if job is None:
+                    break
+                self.__write(*job)
+            except Exception as e:
+                # Re-raised in the training thread
+                self.__error = e
+            finally:
+                self.__queue.task_done()
+
+    def __write(self, fname, links, arrays):
+        # np.savez() appends .npz if missing
+        base, ext = os.path.splitext(fname)
+        tmp = '%s.tmp%s' % (base, ext)
+        np.savez(tmp, **arrays)
+
+        # Readers never see a partially written file
+        os.rename(tmp, fname)
+
+        # Other names for the same checkpoint
+        for link in links:
+            if os.path.exists(link):
+                os.unlink(link)
+            try:
+                os.link(fname, link)
+            except OSError:
+                # e.g. not supported by the file system
+                shutil.copy(fname, link)
+
+    def __check(self):
+        if self.__error is not None:
+            error, self.__error = self.__error, None
+            raise error
+
+    def write(self, fname, links=None, **arrays):
+        """Queue in-memory arrays to be saved into fname and hardlinked
+        to the files in links afterwards."""
+        self.__check()
+        self.__queue.put((fname, links if links else [], arrays))
+
+    def wait(self):
+        """Wait until all queued checkpoints are written."""
+        self.__queue.join()
+        self.__check()
+
+    def close(self):
+        """Write the pending checkpoints and stop the thread."""
+        self.wait()
+        self.__queue.put(None)
+        self.__thread.join()
@@ -10,6 +10,12 @@
 
 from cider_scorer import CiderScorer
 
+try:
+    from sparse_cider import SparseCiderScorer
+except ImportError:
+    # scipy is not available
+    SparseCiderScorer = None
+
 class Cider(object):
     """
     Main Class to compute the CIDEr metric 
@@ -29,6 +35,17 @@ class Cider(object):
         :return: cider (float) : computed CIDEr score for the corpus 
         """
 
+        if SparseCiderScorer is not None:
+            for id in gts:
+                assert(type(res[id]) is list)
+                assert(len(res[id]) == 1)
+                assert(type(gts[id]) is list)
+                assert(len(gts[id]) > 0)
+
+            ids = sorted(gts.keys())
+            cider_scorer = SparseCiderScorer([gts[id] for id in ids], n=self._n, sigma=self._sigma)
+            return cider_scorer.compute_score([res[id][0] for id in ids])
+
         cider_scorer = CiderScorer(n=self._n, sigma=self._sigma)
 
         for id in sorted(gts.keys()):
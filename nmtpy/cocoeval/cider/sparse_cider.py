@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# CIDEr with integer n-gram ids and sparse tf-idf matrices.
+# Gives the same scores as CiderScorer up to floating point rounding.
+
+import os
+import stat
+import hashlib
+import tempfile
+
+import numpy as np
+import scipy.sparse as sp
+
+# Reference statistics per reference set hash
+_CACHE = {}
+
+def ngram_counts(sent, n=4):
+    """Return the counts of 1..n-grams of a sentence as space-joined strings."""
+    words = sent.split()
+    counts = {}
+    for k in xrange(1, n + 1):
+        for i in xrange(len(words) - k + 1):
+            ngram = ' '.join(words[i:i + k])
+            counts[ngram] = counts.get(ngram, 0) + 1
+    return counts
+
+def order_matrix(order, n=4):
+    """Return a one-hot (n-gram id, order) matrix to sum n-grams of the same order."""
+    return sp.csr_matrix((np.ones(len(order)), (np.arange(len(order)), order)), shape=(len(order), n))
+
+def private_cache_dir():
+    """Return a cache directory private to the user under the temporary
+    directory or None if it can not be created safely."""
+    path = os.path.join(tempfile.gettempdir(), 'nmtpy-cider-%d' % os.getuid())
+    try:
+        os.mkdir(path, 0700)
+    except OSError:
+        pass
+
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return None
+    # Refuse directories planted by other users or readable by them
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0077:
+        return None
+    return path
+
+class SparseCiderScorer(object):
+    """CIDEr scorer for a fixed list of references per segment. Document
+    frequencies and reference tf-idf vectors are cached on disk under
+    cache_dir (a private directory under the temporary one by default)."""
+    def __init__(self, refs, n=4, sigma=6.0, cache_dir=None):
+        self.n = n
+        self.sigma = sigma
+
+        md5 = hashlib.md5(str(n))
+        for seg_refs in refs:
+            md5.update('\n'.join(seg_refs) + '\n\n')
+        key = md5.hexdigest()
+
+        if key not in _CACHE:
+            cache_dir = cache_dir or private_cache_dir()
+            fname = os.path.join(cache_dir, '%s.npz' % key) if cache_dir else None
+            if fname and os.path.exists(fname):
+                try:
+                    _CACHE[key] = self.__load(fname)
+                except Exception:
+                    # Unreadable, overwritten below
+                    pass
+            if key not in _CACHE:
+                _CACHE[key] = self.__cook(refs)
+                if fname:
+                    self.__save(fname, _CACHE[key])
+            _CACHE[key]['vocab'] = dict(zip(_CACHE[key]['ngrams'], xrange(len(_CACHE[key]['ngrams']))))
+
+        self.__dict__.update(_CACHE[key])
+        self.orders = order_matrix(self.order, self.n)
+
+    def __cook(self, refs):
+        """Compute the reference statistics."""
+        vocab = {}
+        rows, cols, counts = [], [], []
+        seg_ids = []
+        ref_seg = []
+        for seg, seg_refs in enumerate(refs):
+            for ref in seg_refs:
+                for ngram, count in ngram_counts(ref, self.n).iteritems():
+                    rows.append(len(ref_seg))
+                    cols.append(vocab.setdefault(ngram, len(vocab)))
+                    counts.append(count)
+                ref_seg.append(seg)
+            # Each n-gram counts once per segment
+            seg_ids.extend(set(cols[len(seg_ids):]))
+            seg_ids.extend([-1] * (len(cols) - len(seg_ids)))
+
+        ngrams = sorted(vocab, key=vocab.get)
+        order = np.array([ngram.count(' ') for ngram in ngrams], dtype='int64')
+        seg_ids = np.array(seg_ids, dtype='int64')
+        doc_freq = np.bincount(seg_ids[seg_ids >= 0], minlength=len(ngrams)).astype('float64')
+
+        log_n = np.log(float(len(refs)))
+        idf = log_n - np.log(np.maximum(1.0, doc_freq))
+
+        cols = np.array(cols, dtype='int64')
+        counts = np.array(counts, dtype='float64')
+        n_refs = len(ref_seg)
+        tfidf = sp.csr_matrix((counts * idf[cols], (rows, cols)), shape=(n_refs, len(ngrams)))
+        bigrams = sp.csr_matrix((counts * (order[cols] == 1), (rows, cols)), shape=(n_refs, len(ngrams)))
+        return {'ngrams'    : ngrams,
+                'order'     : order,
+                'log_n'     : log_n,
+                'idf'       : idf,
+                'ref_seg'   : np.array(ref_seg, dtype='int64'),
+                'ref_vecs'  : tfidf,
+                'ref_norms' : np.sqrt(tfidf.multiply(tfidf).dot(order_matrix(order, self.n)).toarray()),
+                # The reference implementation counts bigrams as length
+                'ref_lens'  : np.asarray(bigrams.sum(1)).ravel()}
+
+    def __save(self, fname, stats):
+        arrays = dict([(k, v) for k, v in stats.items() if k not in ('ngrams', 'ref_vecs')])
+        ref_vecs = stats['ref_vecs']
+        # Written to a temporary file first as several processes may share it
+        fd, tmp = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(fname))
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, ngrams=np.array('\n'.join(stats['ngrams'])),
+                     data=ref_vecs.data, indices=ref_vecs.indices, indptr=ref_vecs.indptr,
+                     shape=np.array(ref_vecs.shape), **arrays)
+        os.rename(tmp, fname)
+
+    def __load(self, fname):
+        with np.load(fname, allow_pickle=False) as arrs:
+            stats = dict([(k, arrs[k]) for k in ('order', 'idf', 'ref_seg', 'ref_norms', 'ref_lens')])
+            stats['log_n'] = float(arrs['log_n'])
+            ngrams = str(arrs['ngrams'])
+            stats['ngrams'] = ngrams.split('\n') if ngrams else []
+            stats['ref_vecs'] = sp.csr_matrix((arrs['data'], arrs['indices'], arrs['indptr']),
+                                              shape=tuple(arrs['shape']))
+        return stats
+
+    def compute_score(self, hyps):
+        """Return the corpus score and the scores of each hypothesis."""
+        n_segs = len(hyps)
+        rows, cols, weights = [], [], []
+        # n-grams unseen in references only count in norms
+        oov_norms = np.zeros((n_segs, self.n))
+        hyp_lens = np.zeros(n_segs)
+
+        for seg, hyp in enumerate(hyps):
+            for ngram, count in ngram_counts(hyp, self.n).iteritems():
+                order = ngram.count(' ')
+                if order == 1:
+                    hyp_lens[seg] += count
+                idx = self.vocab.get(ngram)
+                if idx is None:
+                    oov_norms[seg, order] += pow(float(count) * self.log_n, 2)
+                else:
+                    rows.append(seg)
+                    cols.append(idx)
+                    weights.append(float(count) * self.idf[idx])
+
+        hyp_vecs = sp.csr_matrix((weights, (rows, cols)), shape=(n_segs, len(self.ngrams)))
+        hyp_norms = np.sqrt(hyp_vecs.multiply(hyp_vecs).dot(self.orders).toarray() + oov_norms)
+
+        # A row for each (hypothesis, reference) pair
+        hyp_vecs = hyp_vecs[self.ref_seg]
+        hyp_norms = hyp_norms[self.ref_seg]
+        vals = hyp_vecs.minimum(self.ref_vecs).multiply(self.ref_vecs).dot(self.orders).toarray()
+
+        norms = hyp_norms * self.ref_norms
+        nonzero = (hyp_norms != 0) & (self.ref_norms != 0)
+        vals[nonzero] /= norms[nonzero]
+
+        # Gaussian length penalty
+        delta = hyp_lens[self.ref_seg] - self.ref_lens
+        vals *= (np.e ** (-(delta ** 2) / (2 * self.sigma ** 2)))[:, None]
+
+        # Sum over references, mean over n-gram orders
+        scores = np.zeros((n_segs, self.n))
+        np.add.at(scores, self.ref_seg, vals)
+        scores = scores.mean(1) / np.bincount(self.ref_seg, minlength=n_segs) * 10.0
+        return np.mean(scores), scores
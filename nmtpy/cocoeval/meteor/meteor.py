@@ -6,13 +6,12 @@ import os
 import sys
 import subprocess
 import threading
-import pkg_resources
 
-METEOR_JAR = pkg_resources.resource_filename('nmtpy', 'external/meteor-1.5.jar')
+from ...metrics.meteor import meteor_jar
 
 class Meteor:
     def __init__(self, language, norm=False):
-        self.meteor_cmd = ['java', '-jar', '-Xmx2G', METEOR_JAR, '-', '-', '-stdio', '-l', language]
+        self.meteor_cmd = ['java', '-jar', '-Xmx2G', meteor_jar(), '-', '-', '-stdio', '-l', language]
         self.env = os.environ
         self.env['LC_ALL'] = 'en_US.UTF_8'
 
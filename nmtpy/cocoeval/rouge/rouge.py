@@ -32,6 +32,39 @@ def my_lcs(string, sub):
 
     return lengths[len(string)][len(sub)]
 
+def token_masks(sub):
+    """
+    Maps each token of sub to an integer whose i-th bit is set if sub[i] is that token
+    :param sub : list of str : tokens from a string split using whitespace
+    :returns: masks (dict of str to int)
+    """
+    masks = {}
+    for i, token in enumerate(sub):
+        masks[token] = masks.get(token, 0) | (1 << i)
+    return masks
+
+def bitparallel_lcs(string, sub, masks=None):
+    """
+    Calculates the same length as my_lcs with bit-parallel dynamic programming
+    (Allison and Dix, 1986), i.e. one column of the table is updated by a few
+    integer operations per token of string
+    :param string : list of str : tokens from a string split using whitespace
+    :param sub : list of str : tokens from another string
+    :param masks : dict : token_masks(sub) if already computed
+    :returns: length (int): length of the longest common subsequence between the two strings
+    """
+    if masks is None:
+        masks = token_masks(sub)
+
+    full = (1 << len(sub)) - 1
+    v = full
+    for token in string:
+        u = v & masks.get(token, 0)
+        v = ((v + u) | (v - u)) & full
+
+    # Zero bits of v mark the matches
+    return len(sub) - bin(v).count('1')
+
 class Rouge():
     '''
     Class for computing ROUGE-L score for a set of candidate sentences for the MS COCO test set
@@ -55,12 +88,14 @@ class Rouge():
 
         # split into tokens
         token_c = candidate[0].split(" ")
-    	
+        # bit-vectors of the candidate are shared by all references
+        masks_c = token_masks(token_c)
+
         for reference in refs:
             # split into tokens
             token_r = reference.split(" ")
             # compute the longest common subsequence
-            lcs = my_lcs(token_r, token_c)
+            lcs = bitparallel_lcs(token_r, token_c, masks_c)
             prec.append(lcs/float(len(token_c)))
             rec.append(lcs/float(len(token_r)))
 
@@ -26,6 +26,18 @@ TRAIN_DEFAULTS = {
         'valid_njobs':        16,             # # of parallel CPU tasks to do beam-search
         'valid_beam':         12,             # Allow changing beam size during validation
         'valid_freq':         0,              # 0: End of epochs
+        'valid_async':        0,              # Max # of validations running in the background on CPU (0: disabled)
         'sample_freq':        0,              # Sampling frequency during training (0: disabled)
         'save_iter':          False,          # Save each best valid weights to separate file
+        'checkpoint_freq':    0,              # Save full training state every N updates (0: only on SIGUSR1/SIGTERM)
+        'prefetch':           0,              # Prepare this many minibatches in a background thread (0: disabled)
+        'accum_steps':        1,              # Sum gradients of this many minibatches before each update
+        'n_workers':          1,              # # of CPU processes computing gradients of minibatches in parallel
+        'telemetry_freq':     100,            # Append throughput statistics to <model>.telemetry.jsonl every N updates (0: disabled)
+        'lr_decay':           None,           # plateau, restart, step, invsqrt (None: constant lrate)
+        'lr_decay_factor':    0.5,            # lrate multiplier for plateau, restart and step
+        'lr_decay_patience':  2,              # # of validations without improvement for plateau and restart
+        'lr_decay_freq':      10000,          # Decay frequency in updates for step
+        'lr_warmup':          4000,           # # of warmup updates for invsqrt
+        'lr_min':             1e-6,           # Minimum learning rate for plateau, restart and step
         }
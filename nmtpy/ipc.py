@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import ctypes
+from multiprocessing.sharedctypes import RawArray
+
+import numpy as np
+
+# Array offsets inside a slot are aligned to this many bytes
+ALIGN = 16
+
+def _aligned(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+class SharedArrayRing(object):
+    """A ring of fixed-size shared memory slots to exchange numpy arrays
+    between processes without pickling them.
+
+    The ring should be created before forking the worker processes. Slot
+    bookkeeping (acquire/release) is only done by the parent process which
+    then sends slot numbers and small array descriptors through a Queue."""
+    def __init__(self, n_slots, slot_bytes):
+        self.n_slots    = n_slots
+        self.slot_bytes = _aligned(slot_bytes)
+
+        # A single anonymous shared memory block for all slots
+        self._raw = RawArray(ctypes.c_byte, self.n_slots * self.slot_bytes)
+        self._buf = None
+
+        # Free slot idxs (only meaningful in the parent)
+        self._free = list(range(self.n_slots))
+
+    @property
+    def buffer(self):
+        # Lazily create the uint8 view as this has to be done
+        # in each process after fork()
+        if self._buf is None:
+            self._buf = np.frombuffer(self._raw, dtype=np.uint8)
+        return self._buf
+
+    def __getstate__(self):
+        # Shared memory is inherited through fork(), it can not be pickled
+        raise RuntimeError('SharedArrayRing can only be shared through fork().')
+
+    def n_free(self):
+        """Return the number of free slots."""
+        return len(self._free)
+
+    def acquire(self):
+        """Return a free slot idx or None if all slots are in use."""
+        return self._free.pop(0) if self._free else None
+
+    def release(self, slot):
+        """Give back a slot to the ring."""
+        self._free.append(slot)
+
+    def put(self, slot, arrays):
+        """Copy arrays into slot. Returns a list of (dtype, shape, offset)
+        descriptors or None if the arrays do not fit into a single slot."""
+        arrays = [np.asarray(a) for a in arrays]
+        arrays = [a if a.flags.c_contiguous else a.copy() for a in arrays]
+
+        # Compute the layout first
+        meta = []
+        offset = 0
+        for arr in arrays:
+            meta.append((arr.dtype.str, arr.shape, offset))
+            offset += _aligned(arr.nbytes)
+
+        if offset > self.slot_bytes:
+            return None
+
+        base = slot * self.slot_bytes
+        for arr, (_, _, off) in zip(arrays, meta):
+            start = base + off
+            self.buffer[start:start + arr.nbytes] = arr.view(np.uint8).ravel()
+
+        return meta
+
+    def get(self, slot, meta, copy=False):
+        """Return arrays described by meta from slot. The returned arrays
+        are views over shared memory unless copy is True."""
+        base = slot * self.slot_bytes
+        arrays = []
+        for dtype, shape, offset in meta:
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape)) if len(shape) > 0 else 1
+            start = base + offset
+            arr = self.buffer[start:start + count * dtype.itemsize].view(dtype).reshape(shape)
+            arrays.append(arr.copy() if copy else arr)
+        return arrays
@@ -8,7 +8,7 @@ from collections import OrderedDict
 
 from ..sysutils   import fopen
 from .iterator    import Iterator
-from .homogeneous import HomogeneousData
+from .homogeneous import HomogeneousData, BucketData
 
 """Parallel text iterator for translation data."""
 class BiTextIterator(Iterator):
@@ -30,6 +30,9 @@ class BiTextIterator(Iterator):
         self.n_words_src = kwargs.get('n_words_src', 0)
         self.n_words_trg = kwargs.get('n_words_trg', 0)
 
+        # Token budget of batches for shuffle_mode == 'bucket'
+        self.max_tokens = kwargs.get('max_tokens', 0)
+
         self.src_name = kwargs.get('src_name', 'x')
         self.trg_name = kwargs.get('trg_name', 'y')
 
@@ -87,11 +90,21 @@ class BiTextIterator(Iterator):
             # Homogeneous batches ordered by target sequence length
             # Get an iterator over sample idxs
             self._iter = HomogeneousData(self._seqs, self.batch_size, trg_pos=1)
+        elif self.shuffle_mode == 'bucket':
+            # Batches of similar source and target lengths
+            self._iter = BucketData(self._seqs, self.batch_size, src_pos=0, trg_pos=1,
+                                    max_tokens=self.max_tokens)
         else:
             self.rewind()
 
+    def prepare_batches(self):
+        """Split the sample order into minibatches of sample idxs."""
+        self._minibatches = []
+        for i in range(0, self.n_samples, self.batch_size):
+            self._minibatches.append(self._idxs[i:i + self.batch_size])
+
     def rewind(self):
-        if self.shuffle_mode != 'trglen':
+        if self.shuffle_mode not in ('trglen', 'bucket'):
             # Fill in the _idxs list for sample order
             if self.shuffle_mode == 'simple':
                 # Simple shuffle
@@ -100,10 +113,11 @@ class BiTextIterator(Iterator):
                 # Ordered
                 self._idxs = np.arange(self.n_samples).tolist()
 
-            self._iter = []
-            for i in range(0, self.n_samples, self.batch_size):
-                self._iter.append(self._idxs[i:i + self.batch_size])
-            self._iter = iter(self._iter)
+            self.prepare_batches()
+            self._iter = iter(self._minibatches)
+
+    def _sort_key(self, idx):
+        return (len(self._seqs[idx][1]), len(self._seqs[idx][0]))
 
     def mask_seqs(self, idxs):
         """Prepares a list of padded tensors with their masks for the given sample idxs."""
@@ -84,5 +84,85 @@ class HomogeneousData(object):
         # Return batch indices from here
         return curr_indices
 
+    def get_state(self):
+        """Return the iteration state without the data itself."""
+        return copy.deepcopy(dict([(k, getattr(self, k)) for k in \
+                ('len_unique', 'len_indices', 'len_indices_pos', 'len_curr_counts', 'len_idx')]))
+
+    def set_state(self, state):
+        """Restore the iteration state returned by get_state()."""
+        self.__dict__.update(copy.deepcopy(state))
+
+    def __iter__(self):
+        return self
+
+# Iterator that groups samples with similar source and target
+# lengths into buckets and fills batches up to a token budget.
+class BucketData(object):
+    def __init__(self, data, batch_size, src_pos, trg_pos, max_tokens=0, bucket_width=4):
+        self.batch_size = batch_size
+        self.data = data
+        self.src_pos = src_pos
+        self.trg_pos = trg_pos
+        # Max number of padded source + target tokens in a batch
+        # if > 0, otherwise batches have batch_size samples
+        self.max_tokens = max_tokens
+        # Length range of a bucket
+        self.bucket_width = bucket_width
+
+        self.prepare()
+        self.reset()
+
+    def prepare(self):
+        # +1 for <eos>
+        self.src_lens = np.array([len(cc[self.src_pos]) + 1 for cc in self.data])
+        self.trg_lens = np.array([len(cc[self.trg_pos]) + 1 for cc in self.data])
+
+    def __is_full(self, n_samples, max_src, max_trg):
+        if self.max_tokens > 0:
+            return n_samples * (max_src + max_trg) > self.max_tokens
+        return n_samples > self.batch_size
+
+    def reset(self):
+        # Random order inside buckets
+        idxs = np.random.permutation(len(self.data))
+        buckets = (self.trg_lens[idxs] // self.bucket_width) * (self.src_lens.max() + 1) + \
+                  (self.src_lens[idxs] // self.bucket_width)
+        idxs = idxs[np.argsort(buckets, kind='mergesort')]
+
+        # Fill the batches in bucket order
+        self.batches = []
+        batch, max_src, max_trg = [], 0, 0
+        for idx in idxs:
+            src, trg = max(max_src, self.src_lens[idx]), max(max_trg, self.trg_lens[idx])
+            if len(batch) > 0 and self.__is_full(len(batch) + 1, src, trg):
+                self.batches.append(batch)
+                batch, src, trg = [], self.src_lens[idx], self.trg_lens[idx]
+            batch.append(idx)
+            max_src, max_trg = src, trg
+        if len(batch) > 0:
+            self.batches.append(batch)
+
+        # Shuffle the batches of different buckets
+        self.batches = [self.batches[i] for i in np.random.permutation(len(self.batches))]
+        self.batch_idx = 0
+
+    def next(self):
+        # All data consumed
+        if self.batch_idx == len(self.batches):
+            self.reset()
+            raise StopIteration()
+
+        self.batch_idx += 1
+        return self.batches[self.batch_idx - 1]
+
+    def get_state(self):
+        """Return the iteration state without the data itself."""
+        return copy.deepcopy({'batches': self.batches, 'batch_idx': self.batch_idx})
+
+    def set_state(self, state):
+        """Restore the iteration state returned by get_state()."""
+        self.__dict__.update(copy.deepcopy(state))
+
     def __iter__(self):
         return self
@@ -48,6 +48,13 @@ class Iterator(object):
         self._iter     = None
         self._minibatches = []
 
+        # Number of minibatches returned in the current epoch
+        self._n_batches = 0
+
+        # Number of actual and padded tokens since the last padding_ratio() call
+        self._n_tokens = 0
+        self._n_padded = 0
+
         self.shuffle_mode = shuffle_mode
         if self.shuffle_mode:
             # Set random seed
@@ -69,15 +76,86 @@ class Iterator(object):
         try:
             data = self._process_batch(next(self._iter))
         except StopIteration as si:
+            self._n_batches = 0
             self.rewind()
             raise
         else:
+            self._n_batches += 1
             # Lookup the keys and return an ordered dict of the current minibatch
-            return OrderedDict([(k, data[i]) for i,k in enumerate(self._keys)])
+            data = OrderedDict([(k, data[i]) for i,k in enumerate(self._keys)])
+            for k, v in data.items():
+                if k.endswith('_mask'):
+                    self._n_tokens += v.sum()
+                    self._n_padded += v.size
+            return data
+
+    def padding_ratio(self):
+        """Return the ratio of padding in the masked minibatches returned
+        since the last call or None if there are no masks."""
+        ratio = None
+        if self._n_padded > 0:
+            ratio = 1 - self._n_tokens / float(self._n_padded)
+        self._n_tokens = self._n_padded = 0
+        return ratio
+
+    def get_state(self):
+        """Return the sample order and position of the current epoch
+        to be able to resume it."""
+        if self._iter is None:
+            # Not supported by this iterator
+            return None
+        elif hasattr(self._iter, 'get_state'):
+            return self._iter.get_state()
+
+        # Minibatches are built again from the sample order by set_state()
+        return {'idxs'      : np.array(self._idxs),
+                'n_batches' : self._n_batches}
+
+    def set_state(self, state):
+        """Restore the iteration state returned by get_state()."""
+        if state is None:
+            return
+        elif hasattr(self._iter, 'set_state'):
+            self._iter.set_state(state)
+        else:
+            self._idxs = state['idxs']
+            self.prepare_batches()
+            self._iter = iter(self._minibatches)
+            self._n_batches = 0
+            self.skip(state['n_batches'])
+
+    def skip(self, n_batches):
+        """Skip n_batches minibatches without processing them."""
+        for i in range(n_batches):
+            if self._iter is None:
+                next(self)
+            else:
+                next(self._iter)
+                self._n_batches += 1
+
+    def _sort_key(self, idx):
+        """Return the length key of a sample for get_sorted_batches()."""
+        return None
+
+    def get_sorted_batches(self):
+        """Return all the minibatches as a list of (sample idxs, minibatch)
+        where samples are sorted by length to minimize padding. Returns
+        None if the iterator does not support it."""
+        if self.n_samples == 0 or self._sort_key(0) is None:
+            return None
+
+        idxs = sorted(range(self.n_samples), key=self._sort_key)
+
+        batches = []
+        for i in range(0, self.n_samples, self.batch_size):
+            batch_idxs = np.array(idxs[i:i + self.batch_size])
+            data = self._process_batch(batch_idxs)
+            batches.append((batch_idxs, OrderedDict([(k, data[j]) for j,k in enumerate(self._keys)])))
+        return batches
 
     # May or may not be used.
     def prepare_batches(self):
-        """Prepare self.__iter."""
+        """Prepare self._minibatches from self._idxs."""
         pass
 
     @abstractmethod
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+from Queue import Queue, Full
+
+# Sentinel marking the end of an epoch
+_EOE = object()
+
+"""Prepares the next minibatches of an iterator in a background thread."""
+class Prefetcher(object):
+    def __init__(self, iterator, n_batches=0):
+        self.iterator   = iterator
+        self.n_batches  = n_batches
+
+        # Total time spent waiting for a minibatch
+        self.wait_time  = 0.
+
+        if self.n_batches > 0:
+            # A single producer keeps the order of the iterator
+            self.__queue  = Queue(maxsize=self.n_batches)
+            self.__stop   = threading.Event()
+            self.__thread = threading.Thread(target=self.__produce)
+            self.__thread.daemon = True
+            self.__thread.start()
+
+    def __put(self, item):
+        # Retry until there is room or close() is called
+        while not self.__stop.is_set():
+            try:
+                self.__queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def __produce(self):
+        try:
+            for data in self.iterator:
+                if not self.__put(data):
+                    return
+        except Exception as e:
+            # Re-raised in the consumer
+            self.__put(e)
+        else:
+            self.__put(_EOE)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        start = time.time()
+        try:
+            if self.n_batches == 0:
+                return next(self.iterator)
+
+            data = self.__queue.get()
+        finally:
+            self.wait_time += time.time() - start
+
+        if data is _EOE:
+            raise StopIteration
+        elif isinstance(data, Exception):
+            raise data
+        return data
+
+    def close(self):
+        """Stop the background thread, e.g. when training stops in the middle of an epoch."""
+        if self.n_batches > 0:
+            self.__stop.set()
+            self.__thread.join()
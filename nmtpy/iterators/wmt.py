@@ -12,7 +12,7 @@ import numpy as np
 
 from ..nmtutils     import sent_to_idx
 from .iterator      import Iterator
-from .homogeneous   import HomogeneousData
+from .homogeneous   import HomogeneousData, BucketData
 
 # This is an iterator specifically to be used by the .pkl
 # corpora files created for WMT16 Shared Task on Multimodal Machine Translation
@@ -42,6 +42,9 @@ class WMTIterator(Iterator):
         # 'pairs'   : Take only one-to-one pairs e.g., train_i.en->train_i.de (~145K parallel)
         self.mode = kwargs.get('mode', 'pairs')
 
+        # Token budget of batches for shuffle_mode == 'bucket'
+        self.max_tokens = kwargs.get('max_tokens', 0)
+
         # pkl file which contains a list of samples
         self.pklfile = kwargs['pklfile']
         # Resnet-50 image features file
@@ -148,13 +151,15 @@ class WMTIterator(Iterator):
             # Homogeneous batches ordered by target sequence length
             # Get an iterator over sample idxs
             self._iter = HomogeneousData(self._seqs, self.batch_size, trg_pos=5)
+        elif self.shuffle_mode == 'bucket':
+            # Batches of similar source and target lengths
+            self._iter = BucketData(self._seqs, self.batch_size, src_pos=4, trg_pos=5,
+                                    max_tokens=self.max_tokens)
         else:
             # For once keep it ordered
             self._idxs = np.arange(self.n_samples).tolist()
-            self._iter = []
-            for i in range(0, self.n_samples, self.batch_size):
-                self._iter.append(self._idxs[i:i + self.batch_size])
-            self._iter = iter(self._iter)
+            self.prepare_batches()
+            self._iter = iter(self._minibatches)
 
     def process_single(self, idx):
         data, _ = Iterator.mask_data([self._seqs[idx][4]])
@@ -167,6 +172,12 @@ class WMTIterator(Iterator):
             data.append(trg)
         return data
 
+    def _sort_key(self, idx):
+        # Caching the batches would duplicate the image features
+        if self.img_avail or not self.trg_avail:
+            return None
+        return (len(self._seqs[idx][5]), len(self._seqs[idx][4]))
+
     def mask_seqs(self, idxs):
         """Prepares a list of padded tensors with their masks for the given sample idxs."""
         data = list(Iterator.mask_data([self._seqs[i][4] for i in idxs]))
@@ -183,8 +194,14 @@ class WMTIterator(Iterator):
 
         return data
 
+    def prepare_batches(self):
+        """Split the sample order into minibatches of sample idxs."""
+        self._minibatches = []
+        for i in range(0, self.n_samples, self.batch_size):
+            self._minibatches.append(self._idxs[i:i + self.batch_size])
+
     def rewind(self):
-        if self.shuffle_mode != 'trglen':
+        if self.shuffle_mode not in ('trglen', 'bucket'):
             # Fill in the _idxs list for sample order
             if self.shuffle_mode == 'simple':
                 # Simple shuffle
@@ -193,7 +210,5 @@ class WMTIterator(Iterator):
                 # Ordered
                 self._idxs = np.arange(self.n_samples).tolist()
 
-            self._iter = []
-            for i in range(0, self.n_samples, self.batch_size):
-                self._iter.append(self._idxs[i:i + self.batch_size])
-            self._iter = iter(self._iter)
+            self.prepare_batches()
+            self._iter = iter(self._minibatches)
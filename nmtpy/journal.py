@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import os
+import cPickle
+
+class ShardJournal(object):
+    """On-disk progress journal for sharded decoding.
+
+    Each finished shard is pickled into its own file which is atomically
+    renamed into place and then appended to the journal file. A shard is
+    considered done only if it is listed in the journal."""
+    def __init__(self, path, n_samples, shard_size, header=None):
+        self.path       = path
+        self.n_samples  = n_samples
+        self.shard_size = shard_size
+        self.n_shards   = (n_samples + shard_size - 1) // shard_size
+
+        # Decoding options that should not change across restarts
+        self.header = dict(header) if header else {}
+        self.header.update({'n_samples': n_samples, 'shard_size': shard_size})
+
+        self.journal_file = os.path.join(self.path, 'journal')
+        self.header_file  = os.path.join(self.path, 'header.pkl')
+
+        # Set of finished shard idxs
+        self.done = set()
+
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+        if os.path.exists(self.header_file):
+            with open(self.header_file, 'rb') as f:
+                old_header = cPickle.load(f)
+            if old_header != self.header:
+                raise Exception('Journal %s was created with different options: %s' % (self.path, old_header))
+
+            self.__read()
+        else:
+            self.__write_atomic(self.header_file, self.header)
+
+    def __shard_file(self, shard):
+        return os.path.join(self.path, 'shard.%06d.pkl' % shard)
+
+    def __write_atomic(self, fname, obj):
+        tmp = '%s.tmp%d' % (fname, os.getpid())
+        with open(tmp, 'wb') as f:
+            cPickle.dump(obj, f, cPickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, fname)
+
+    def __read(self):
+        if not os.path.exists(self.journal_file):
+            return
+
+        with open(self.journal_file) as f:
+            for line in f:
+                line = line.strip()
+                # A partially written last line is simply ignored
+                if line.isdigit() and os.path.exists(self.__shard_file(int(line))):
+                    self.done.add(int(line))
+
+    def shard_of(self, idx):
+        """Return the shard idx of a sample."""
+        return idx // self.shard_size
+
+    def shard_range(self, shard):
+        """Return the sample idxs of a shard."""
+        return range(shard * self.shard_size, min((shard + 1) * self.shard_size, self.n_samples))
+
+    def is_done(self, shard):
+        return shard in self.done
+
+    def n_done_samples(self):
+        return sum([len(self.shard_range(s)) for s in self.done])
+
+    def commit(self, shard, results):
+        """Persist the results of a finished shard."""
+        self.__write_atomic(self.__shard_file(shard), results)
+        with open(self.journal_file, 'a') as f:
+            f.write('%d\n' % shard)
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.add(shard)
+
+    def load(self, shard):
+        """Return the results of a finished shard."""
+        with open(self.__shard_file(shard), 'rb') as f:
+            return cPickle.load(f)
@@ -1,9 +1,22 @@
 # -*- coding: utf-8 -*-
-from shutil import copy
-
 import numpy as np
+import cPickle
+import random
+import signal
 import time
 import os
+import threading
+from multiprocessing import Process, Queue
+from Queue import Empty, Queue as JobQueue
+
+from .iterators.prefetch import Prefetcher
+from .checkpoint import CheckpointWriter
+from .schedulers import get_scheduler
+from .parallel import GradientWorkers
+from .telemetry import Telemetry
+from .nmtutils import get_param_dict
+from .metrics import get_scorer
+from . import cleanup
 
 class MainLoop(object):
     def __init__(self, model, logger, train_args):
@@ -35,9 +48,27 @@ class MainLoop(object):
         self.f_valid        = train_args.valid_freq
         self.f_sample       = train_args.sample_freq
         self.f_verbose      = 10
+        self.prefetch       = train_args.prefetch
+        self.accum_steps    = train_args.accum_steps
+        self.seed           = train_args.seed
+
+        # Data-parallel training: each update averages the gradients of
+        # n_workers * accum_steps minibatches
+        self.n_workers      = train_args.n_workers
+        self.update_batches = self.accum_steps * self.n_workers
+        self.workers        = None
         self.do_sampling    = self.f_sample > 0
         self.do_beam_search = self.valid_metric != 'px'
 
+        # Max number of validations running in the background
+        # on parameter snapshots (0: validate synchronously)
+        self.valid_async    = train_args.valid_async
+        self.pending_valid  = []
+
+        # Thread scoring background validations off the training path
+        self.scorer         = None
+        self.score_jobs     = JobQueue()
+
         # NOTE: This is relevant only for fusion models + WMTIterator
         self.valid_mode     = 'single'
         if 'valid_mode' in self.model.__dict__:
@@ -54,30 +85,253 @@ class MainLoop(object):
         # If f_valid == 0, do validation at end of epochs
         self.epoch_valid    = (self.f_valid == 0)
 
+        # Best models are written in the background
+        self.writer         = CheckpointWriter(max_pending=2)
+
+        # Full training state checkpoints
+        self.f_checkpoint   = train_args.checkpoint_freq
+        self.state_file     = self.model.save_path + '.state.pkl'
+
+        # Losses of the current epoch
+        self.batch_losses   = []
+
+        # Iteration order and RNG states at the start of the current epoch
+        self.epoch_state    = None
+
+        # Throughput statistics written every f_telemetry updates
+        self.f_telemetry    = train_args.telemetry_freq
+        self.telemetry      = None
+
+        # Learning rate scheduler
+        self.scheduler      = None
+        if train_args.lr_decay:
+            Scheduler = get_scheduler(train_args.lr_decay)
+            self.scheduler = Scheduler(self.model.lrate, logger,
+                                       factor=train_args.lr_decay_factor,
+                                       patience=train_args.lr_decay_patience,
+                                       freq=train_args.lr_decay_freq,
+                                       warmup=train_args.lr_warmup,
+                                       min_lrate=train_args.lr_min)
+            self._print('Learning rate scheduler: %s' % train_args.lr_decay)
+            # Initial lrate, e.g. for warmup
+            self.__update_lrate()
+
+        # Set by signal handlers: 'save' or 'stop'
+        self.__signal       = None
+
+        # State to resume the interrupted epoch from
+        self.__resume       = None
+
+        # Background validations of the checkpoint to start again
+        self.__requeue      = []
+
+        # Dropout RNG states of the gradient workers of the checkpoint
+        self.__worker_rng   = None
+
     def _print(self, msg, footer=False):
         """Pretty prints a message."""
         self.__log.info(msg)
         if footer:
             self.__log.info('-' * len(msg))
 
-    def save_best_model(self):
-        """Overwrite best on-disk model and saves it as a different file optionally."""
-        if self.save_best:
-            self._print('Saving the best model')
-            self.model.save(self.model.save_path + '.npz')
+    def save_best_model(self, snapshot=None, uctr=None):
+        """Overwrite best on-disk model and saves it as a different file optionally.
+        snapshot and uctr are given for parameters validated in the background."""
+        # Training only waits for the in-memory copy, files are
+        # written by a background thread
+        if snapshot is None:
+            snapshot = self.model.snapshot()
+        if uctr is None:
+            uctr = self.uctr
 
         # Save each best model as different files, can be useful for ensembling
-        if self.save_iter:
-            self._print('Saving best model at iteration %d' % self.uctr)
-            model_path_uidx = '%s.iter%d.npz' % (self.model.save_path, self.uctr)
-            copy(self.model.save_path + '.npz', model_path_uidx)
+        model_path_uidx = '%s.iter%d.npz' % (self.model.save_path, uctr)
+
+        if self.save_best:
+            self._print('Saving the best model')
+            links = []
+            if self.save_iter:
+                # Hardlink to the same file instead of copying it
+                self._print('Saving best model at iteration %d' % uctr)
+                links.append(model_path_uidx)
+            self.writer.write(self.model.save_path + '.npz', links=links, **snapshot)
+
+        elif self.save_iter:
+            self._print('Saving best model at iteration %d' % uctr)
+            self.writer.write(model_path_uidx, **snapshot)
+
+    def __get_epoch_state(self):
+        """Return the iteration order and RNG states of the starting epoch."""
+        return {'iterator'  : self.model.train_iterator.get_state(),
+                'np_rng'    : np.random.get_state(),
+                'py_rng'    : random.getstate()}
+
+    def save_state(self):
+        """Save the full training state to resume training from."""
+        # Unfinished background validations are saved and started
+        # again on resume instead of waiting for them
+        self.__collect_validations()
+        self.writer.wait()
+
+        state = {'save_path'    : self.model.save_path,
+                 'model'        : self.model.get_state(),
+                 'uctr'         : self.uctr,
+                 'ectr'         : self.ectr,
+                 'vctr'         : self.vctr,
+                 'early_bad'    : self.early_bad,
+                 'epoch_losses' : self.epoch_losses,
+                 'valid_losses' : self.valid_losses,
+                 'valid_metrics': self.valid_metrics,
+                 'batch_losses' : self.batch_losses,
+                 'epoch_state'  : self.epoch_state,
+                 'pending_valid': [(v['vctr'], v['uctr'], v['snapshot']) for v in self.pending_valid],
+                 'worker_rng'   : self.workers.get_rng_states() if self.workers else [],
+                 'scheduler'    : None}
+
+        if self.scheduler:
+            state['scheduler'] = self.scheduler.get_state()
+
+        # Write to a temporary file first so that a crash
+        # never leaves a truncated checkpoint behind
+        tmp = '%s.tmp' % self.state_file
+        with open(tmp, 'wb') as f:
+            cPickle.dump(state, f, cPickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, self.state_file)
+
+        self._print('Saved training state at update %d to %s' % (self.uctr, self.state_file))
+
+    def load_state(self, fname):
+        """Load a training state saved by save_state(). Training resumes
+        from the next update of the interrupted epoch."""
+        with open(fname, 'rb') as f:
+            state = cPickle.load(f)
+
+        self.model.set_state(state['model'])
+
+        # Continue writing to the same files
+        self.model.save_path = state['save_path']
+        self.state_file      = self.model.save_path + '.state.pkl'
+
+        self.uctr           = state['uctr']
+        self.vctr           = state['vctr']
+        self.early_bad      = state['early_bad']
+        self.epoch_losses   = state['epoch_losses']
+        self.valid_losses   = state['valid_losses']
+        self.valid_metrics  = state['valid_metrics']
+        self.__requeue      = state.get('pending_valid', [])
+        self.__worker_rng   = state.get('worker_rng', [])
+
+        if self.scheduler and state.get('scheduler'):
+            self.scheduler.set_state(state['scheduler'])
+
+        # _train_epoch() will increment it again
+        self.ectr           = state['ectr'] - 1
+        self.__resume       = state
+
+        self._print('Resuming from update %d (epoch %d) of %s' % (self.uctr, state['ectr'], fname))
+
+    def __resume_epoch(self):
+        """Restore the interrupted epoch and skip its finished updates."""
+        state, self.__resume = self.__resume, None
+
+        self.epoch_state = state['epoch_state']
+        self.model.train_iterator.set_state(self.epoch_state['iterator'])
+        np.random.set_state(self.epoch_state['np_rng'])
+        random.setstate(self.epoch_state['py_rng'])
+
+        self.model.train_iterator.skip(len(state['batch_losses']))
+        return list(state['batch_losses'])
+
+    def __on_signal(self, signum, frame):
+        """Save the training state at the next update boundary."""
+        if signum == signal.SIGTERM:
+            self._print('SIGTERM received, will save training state and stop.')
+            self.__signal = 'stop'
+            # A second SIGTERM stops immediately
+            signal.signal(signal.SIGTERM, self.__prev_sigterm)
+        else:
+            self._print('SIGUSR1 received, will save training state.')
+            self.__signal = 'save'
 
-    # TODO
     def __update_lrate(self):
         """Update learning rate by annealing it."""
-        #self.model.update_lrate(newlrate)
-        pass
-    
+        if self.scheduler:
+            lrate = self.scheduler.step(self.uctr)
+            if lrate is not None:
+                self.model.update_lrate(lrate)
+
+    def __restart_from_best(self):
+        """Reload the best parameters, e.g. after decaying the learning rate."""
+        if not self.save_best:
+            return
+
+        # Make sure the best model is on disk
+        self.writer.wait()
+        best_path = self.model.save_path + '.npz'
+        self._print('Restarting from the best model %s' % os.path.basename(best_path))
+        self.model.set_shared_variables(get_param_dict(best_path))
+
+    def __accum_grads(self, batches):
+        """Accumulate the gradients of minibatches, in parallel if requested."""
+        if self.workers:
+            self.batch_losses.extend(self.workers.accum_grads(batches))
+        else:
+            for data in batches:
+                self.batch_losses.append(self.model.accum_grads(*data.values()))
+
+    def __train_batches(self, batches):
+        """Yield the loss and the last minibatch of each update. Gradients are
+        accumulated over update_batches minibatches if requested."""
+        n_accum = 0
+        group = []
+        for data in batches:
+            if self.telemetry:
+                self.telemetry.add_batch(data)
+
+            # Forward/backward and get loss
+            if self.update_batches == 1:
+                loss = self.model.train_batch(*data.values())
+                self.batch_losses.append(loss)
+                yield loss, data
+                continue
+
+            # A minibatch for each worker
+            group.append(data)
+            if len(group) < self.n_workers:
+                continue
+
+            self.__accum_grads(group)
+            n_accum += len(group)
+            group = []
+
+            if n_accum == self.update_batches:
+                self.model.apply_grads(n_accum)
+                yield np.mean(self.batch_losses[-n_accum:]), data
+                n_accum = 0
+
+        # Leftover minibatches at the end of the epoch
+        if len(group) > 0:
+            self.__accum_grads(group)
+            n_accum += len(group)
+
+        if n_accum > 0:
+            self.model.apply_grads(n_accum)
+            yield np.mean(self.batch_losses[-n_accum:]), data
+
+    def __add_time(self, key, start):
+        """Add the time elapsed since start to telemetry."""
+        if self.telemetry:
+            self.telemetry.times[key] += time.time() - start
+
+    def __write_telemetry(self, loss):
+        """Write throughput statistics if it is time to."""
+        if self.telemetry and self.uctr % self.f_telemetry == 0:
+            self.telemetry.write(update=self.uctr, epoch=self.ectr, loss=float(loss),
+                                 lrate=float(self.model.learning_rate.get_value()),
+                                 grad_norm=float(self.model.grad_norm.get_value()))
+
     def _print_loss(self, loss):
         if self.uctr % self.f_verbose == 0:
             self._print("Epoch: %6d, update: %7d, cost: %10.6f" % (self.ectr, self.uctr, loss))
@@ -90,49 +344,89 @@ class MainLoop(object):
         start_uctr = self.uctr
         self._print('Starting Epoch %d' % self.ectr, True)
 
-        batch_losses = []
-
-        # Iterate over batches
-        for data in self.model.train_iterator:
-            self.uctr += 1
-
-            # Forward/backward and get loss
-            loss = self.model.train_batch(*data.values())
-            batch_losses.append(loss)
-
-            # verbose
-            self._print_loss(loss)
-
-            # Should we stop
-            if self.uctr == self.max_updates:
-                self._print("Max iteration %d reached." % self.uctr)
-                return False
-
-            # Update learning rate if requested
-            self.__update_lrate()
+        if self.__resume is not None:
+            # Continue the interrupted epoch
+            self.batch_losses = self.__resume_epoch()
+            start_uctr -= int(np.ceil(len(self.batch_losses) / float(self.update_batches)))
+        else:
+            # Needed to resume this epoch from a checkpoint
+            self.epoch_state = self.__get_epoch_state()
+            self.batch_losses = []
 
-            # Do sampling
-            self.__do_sampling(data)
+        # Minibatches are optionally prepared in the background
+        batches = Prefetcher(self.model.train_iterator, self.prefetch)
 
-            # Do validation
-            if not self.epoch_valid and self.uctr % self.f_valid == 0:
-                self.__do_validation()
-
-            # Check stopping conditions
-            if self.early_stop:
-                self._print("Early stopped.")
-                return False
+        # Iterate over batches
+        try:
+            t_last, wait_last = time.time(), 0.
+            for loss, data in self.__train_batches(batches):
+                self.uctr += 1
+
+                if self.telemetry:
+                    # Time spent waiting for data and in forward/backward
+                    t_data = batches.wait_time - wait_last
+                    self.telemetry.times['data'] += t_data
+                    self.telemetry.times['train'] += time.time() - t_last - t_data
+                    self.telemetry.n_updates += 1
+
+                # verbose
+                self._print_loss(loss)
+
+                # Should we stop
+                if self.uctr == self.max_updates:
+                    self._print("Max iteration %d reached." % self.uctr)
+                    return False
+
+                # Update learning rate if requested
+                self.__update_lrate()
+
+                # Do sampling
+                self.__do_sampling(data)
+
+                # Do validation
+                t_valid = time.time()
+                if not self.epoch_valid and self.uctr % self.f_valid == 0:
+                    self.__do_validation()
+
+                # Apply finished background validations
+                self.__collect_validations()
+                self.__add_time('valid', t_valid)
+
+                # Check stopping conditions
+                if self.early_stop:
+                    self._print("Early stopped.")
+                    return False
+
+                # Save the full training state periodically or if requested
+                if self.__signal or (self.f_checkpoint > 0 and self.uctr % self.f_checkpoint == 0):
+                    self.save_state()
+                    if self.__signal == 'stop':
+                        return False
+                    self.__signal = None
+
+                self.__write_telemetry(loss)
+                t_last, wait_last = time.time(), batches.wait_time
+        finally:
+            batches.close()
 
         # An epoch is finished
         epoch_time = time.time() - start
 
         # Print epoch summary
         up_ctr = self.uctr - start_uctr
-        self.dump_epoch_summary(batch_losses, epoch_time, up_ctr)
+        self.dump_epoch_summary(self.batch_losses, epoch_time, up_ctr)
+        padding = getattr(self.model.train_iterator, 'padding_ratio', lambda: None)()
+        if padding is not None:
+            self._print("--> Padding ratio: %.2f%%" % (100 * padding))
+        self._print("--> Waited %.3f seconds for data (%.1f%% of epoch, prefetch: %d)" % (batches.wait_time,
+                                                                                     100 * batches.wait_time / epoch_time,
+                                                                                     self.prefetch))
 
         # Do validation
         if self.epoch_valid:
+            t_valid = time.time()
             self.__do_validation()
+            self.__add_time('valid', t_valid)
 
         # Check whether maximum epoch is reached
         if self.ectr == self.max_epochs:
@@ -175,49 +469,205 @@ class MainLoop(object):
         if metric is None and loss < np.array(self.valid_losses).min():
             return True
 
+    def __validate(self):
+        """Compute validation loss and hypotheses of the current parameters."""
+        self.model.set_dropout(False)
+        cur_loss = self.model.val_loss()
+        self.model.set_dropout(True)
+
+        hyps = None
+        # Are we doing translation?
+        if self.do_beam_search:
+            hyps = self.model.translate_valid(beam_size=self.beam_size,
+                                              n_jobs=self.njobs,
+                                              mode='beamsearch',
+                                              valid_mode=self.valid_mode)
+        return cur_loss, hyps
+
+    def __score(self, hyps):
+        """Score validation hypotheses in the training process so that
+        scorers like METEOR keep their process between validations."""
+        hyp_file, ref_files = hyps
+        try:
+            score = get_scorer(self.valid_metric)().compute(ref_files, hyp_file)
+        finally:
+            os.unlink(hyp_file)
+            cleanup.temp_files.discard(hyp_file)
+        return str(score), score.score
+
+    def __score_loop(self):
+        """Score background validations one at a time."""
+        while True:
+            valid = self.score_jobs.get()
+            if valid is None:
+                return
+            try:
+                valid['score'] = self.__score(valid['hyps'])
+            except Exception as e:
+                valid['score'] = e
+            valid['scored'].set()
+
+    def __queue_score(self, valid):
+        """Hand the hypotheses of a background validation to the scorer thread."""
+        if self.scorer is None:
+            self.scorer = threading.Thread(target=self.__score_loop)
+            self.scorer.daemon = True
+            self.scorer.start()
+        valid['scored'] = threading.Event()
+        self.score_jobs.put(valid)
+
+    def __validate_child(self, queue, tparams=None):
+        """Background validation process, the parameters are the ones at
+        fork() unless tparams is given."""
+        # Only clean up our own nmt-translate and temporary files when terminated
+        cleanup.subprocesses.clear()
+        cleanup.temp_files.clear()
+        cleanup.register_handler()
+
+        if tparams is not None:
+            self.model.set_shared_variables(tparams)
+        queue.put(self.__validate())
+
+    def __start_validation(self, vctr=None, uctr=None, snapshot=None):
+        """Start a validation of the current parameters (or of the given
+        snapshot of a checkpoint) in the background."""
+        # Bound the number of validations running in the background
+        while len(self.pending_valid) > 0 and len(self.pending_valid) >= self.valid_async:
+            self.__collect_validations(block=True)
+
+        # Prepare the validation batches once in this process
+        self.model.get_valid_batches()
+
+        tparams = None
+        if snapshot is not None:
+            tparams = snapshot['tparams']
+        else:
+            # Keep a copy of the parameters to save them if they are the best
+            vctr, uctr, snapshot = self.vctr, self.uctr, self.model.snapshot()
+
+        queue = Queue()
+        proc = Process(target=self.__validate_child, args=(queue, tparams))
+        proc.start()
+        cleanup.register_proc(proc.pid)
+
+        self.pending_valid.append({'vctr': vctr, 'uctr': uctr, 'snapshot': snapshot,
+                                   'proc': proc, 'queue': queue, 'result': None,
+                                   'hyps': None, 'scored': None, 'score': (None, None)})
+        self._print("Validation %2d started in the background (update %d)" % (vctr, uctr))
+
+    def __stop_validations(self):
+        """Terminate background validations, they are in the saved training state."""
+        for valid in self.pending_valid:
+            if valid['proc'] is not None:
+                valid['proc'].terminate()
+                valid['proc'].join()
+                cleanup.unregister_proc(valid['proc'].pid)
+            self._print("Validation %2d stopped, it will run again on resume" % valid['vctr'])
+        self.pending_valid = []
+
+    def __fetch_validation(self, valid, block=False):
+        """Fetch the result of a background validation and queue its
+        hypotheses for scoring. Returns False if it is still running."""
+        proc = valid['proc']
+        try:
+            valid['result'] = valid['queue'].get(block, 5)
+        except Empty:
+            if proc.is_alive():
+                return False
+            # Died without a result
+
+        proc.join()
+        cleanup.unregister_proc(proc.pid)
+        valid['proc'] = None
+
+        if valid['result'] is None:
+            self._print("Validation %2d failed (exit code %s)" % (valid['vctr'], proc.exitcode))
+        elif valid['result'][1] is not None:
+            valid['hyps'] = valid['result'][1]
+            cleanup.register_tmp_file(valid['hyps'][0])
+            self.__queue_score(valid)
+        return True
+
+    def __collect_validations(self, block=False):
+        """Apply the results of finished and scored background validations in order."""
+        # Start scoring whatever finished
+        for valid in self.pending_valid:
+            if valid['proc'] is not None:
+                self.__fetch_validation(valid)
+
+        while len(self.pending_valid) > 0:
+            valid = self.pending_valid[0]
+            if valid['proc'] is not None and not self.__fetch_validation(valid, block):
+                if block:
+                    continue
+                return
+
+            if valid['scored'] is not None and not valid['scored'].wait(5 if block else 0):
+                if block:
+                    continue
+                return
+
+            self.pending_valid.pop(0)
+            if valid['result'] is None:
+                continue
+            if isinstance(valid['score'], Exception):
+                self._print("Validation %2d scoring failed: %s" % (valid['vctr'], valid['score']))
+                continue
+            self.__apply_validation(valid['vctr'], valid['uctr'], valid['result'][0],
+                                    valid['score'], valid['snapshot'])
+
     def __do_validation(self):
         """Do early-stopping validation."""
         if self.ectr >= self.valid_start:
             self.vctr += 1
 
-            # Compute validation loss
-            self.model.set_dropout(False)
-            cur_loss = self.model.val_loss()
-            self.model.set_dropout(True)
-
-            # Compute perplexity
-            ppl = np.exp(cur_loss)
-
-            self._print("Validation %2d - loss = %5.5f (PPL: %4.5f)" % (self.vctr, cur_loss, ppl))
-
-            metric = None
-            # Are we doing translation?
-            if self.do_beam_search:
-                metric_str, metric = self.model.run_beam_search(beam_size=self.beam_size,
-                                                                n_jobs=self.njobs,
-                                                                metric=self.valid_metric,
-                                                                mode='beamsearch',
-                                                                valid_mode=self.valid_mode)
-
-                self._print("Validation %2d - %s" % (self.vctr, metric_str))
-
-            if self._is_best(cur_loss, metric):
-                self.save_best_model()
-                self.early_bad = 0
+            if self.valid_async > 0:
+                self.__start_validation()
             else:
-                self.early_bad += 1
-                self._print("Early stopping patience: %d validation left" % (self.early_patience - self.early_bad))
-
-            # Store values
-            self.valid_losses.append(cur_loss)
-            if metric is not None:
-                self.valid_metrics.append((metric_str, metric))
-
-            self.early_stop = (self.early_bad == self.early_patience)
-            self.dump_val_summary()
+                cur_loss, hyps = self.__validate()
+                score = self.__score(hyps) if hyps is not None else (None, None)
+                self.__apply_validation(self.vctr, self.uctr, cur_loss, score)
+
+    def __apply_validation(self, vctr, uctr, cur_loss, score, snapshot=None):
+        """Update early-stopping state with the results of a validation."""
+        metric_str, metric = score
+
+        # Compute perplexity
+        ppl = np.exp(cur_loss)
+
+        self._print("Validation %2d - loss = %5.5f (PPL: %4.5f)" % (vctr, cur_loss, ppl))
+
+        if self.do_beam_search:
+            self._print("Validation %2d - %s" % (vctr, metric_str))
+
+        is_best = self._is_best(cur_loss, metric)
+        if is_best:
+            self.save_best_model(snapshot, uctr)
+            self.early_bad = 0
+        else:
+            self.early_bad += 1
+            self._print("Early stopping patience: %d validation left" % (self.early_patience - self.early_bad))
+
+        # Anneal learning rate
+        if self.scheduler:
+            lrate = self.scheduler.validated(is_best)
+            if lrate is not None:
+                self.model.update_lrate(lrate)
+                if self.scheduler.restart:
+                    self.__restart_from_best()
+
+        # Store values
+        self.valid_losses.append(cur_loss)
+        if metric is not None:
+            self.valid_metrics.append((metric_str, metric))
+
+        self.early_stop = (self.early_bad == self.early_patience)
+        self.dump_val_summary()
 
     def dump_val_summary(self):
         """Print validation summary."""
+        if len(self.valid_losses) == 0:
+            return
         best_valid_idx = np.argmin(np.array(self.valid_losses)) + 1
         best_vloss = self.valid_losses[best_valid_idx - 1]
         best_px = np.exp(best_vloss)
@@ -236,7 +686,50 @@ class MainLoop(object):
     def run(self):
         """Run training loop."""
         self.model.set_dropout(True)
-        while self._train_epoch():
-            pass
+
+        # Checkpoint on request
+        signal.signal(signal.SIGUSR1, self.__on_signal)
+        self.__prev_sigterm = signal.signal(signal.SIGTERM, self.__on_signal)
+
+        try:
+            if self.f_telemetry > 0:
+                self.telemetry = Telemetry(self.model.save_path + '.telemetry.jsonl')
+                self._print('Writing throughput statistics to %s' % self.telemetry.fname)
+
+            if self.n_workers > 1:
+                self._print('Starting %d gradient workers' % (self.n_workers - 1))
+                self.workers = GradientWorkers(self.model, self.n_workers, self.seed)
+
+            if self.__worker_rng is not None:
+                if len(self.__worker_rng) == self.n_workers - 1:
+                    if self.workers:
+                        self.workers.set_rng_states(self.__worker_rng)
+                else:
+                    self._print('Checkpoint was saved with %d gradient workers, '
+                                'resumed training will not be exact' % (len(self.__worker_rng) + 1))
+
+            # Validations which were running when the checkpoint was saved
+            requeue, self.__requeue = self.__requeue, []
+            for vctr, uctr, snapshot in requeue:
+                self.__start_validation(vctr, uctr, snapshot)
+
+            while self._train_epoch():
+                pass
+
+            if self.__signal == 'stop':
+                self.__stop_validations()
+            else:
+                # Wait for the last background validations
+                self.__collect_validations(block=True)
+        finally:
+            if self.telemetry:
+                self.telemetry.close()
+            if self.workers:
+                self.workers.close()
+            if self.scorer:
+                # Does not wait for a scoring in progress when stopping
+                self.score_jobs.put(None)
+            # Finish writing the best model
+            self.writer.close()
         # Final summary
         self.dump_val_summary()
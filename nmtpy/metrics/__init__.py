@@ -1,13 +1,76 @@
-from bleu   import MultiBleuScorer
+from bleu   import BLEUScorer, MultiBleuScorer
 from meteor import METEORScorer
 
+from collections import OrderedDict
+
+from ..sysutils import run_concurrently
+
 def get_scorer(scorer):
     scorers = {
                 'meteor': METEORScorer,
-                'bleu'  : MultiBleuScorer,
+                'bleu'  : BLEUScorer,
               }
 
     if scorer == 'all':
         return scorers
     else:
         return scorers[scorer]
+
+def compute_metrics(refs, hyps, scorers):
+    """Compute the given metrics concurrently, each in a thread, and return an
+    OrderedDict of scores. hyps is a hypotheses file or a list of hypotheses."""
+    if isinstance(hyps, str):
+        # Read once for all scorers
+        with open(hyps) as f:
+            hyps = f.read().split('\n')
+        if hyps[-1] == '':
+            hyps.pop()
+
+    funcs = [lambda scorer=scorer: get_scorer(scorer)().compute(refs, hyps) for scorer in scorers]
+    return OrderedDict(zip(scorers, run_concurrently(funcs)))
+
+"""Accumulates the sufficient statistics of hypotheses arriving in any
+order so that scores are available without re-reading them. Scorers
+with a score_totals() method (BLEU) keep running sums of statistics,
+the others keep the statistics of each hypothesis until score()."""
+class IncrementalMetrics(object):
+    def __init__(self, refs, scorers):
+        self.scorers    = OrderedDict([(name, get_scorer(name)()) for name in scorers])
+        self.refs       = dict([(name, s.load_refs(refs)) for name, s in self.scorers.items()])
+        # Statistics of each hypothesis per metric
+        self.stats      = dict([(name, {}) for name in self.scorers])
+        # Summed statistics per metric
+        self.totals     = dict([(name, None) for name, s in self.scorers.items() if hasattr(s, 'score_totals')])
+        self.n_hyps     = 0
+
+    def add(self, idx, hyp):
+        """Add the statistics of the idx'th hypothesis."""
+        if isinstance(hyp, unicode):
+            hyp = hyp.encode('utf-8')
+
+        for name, scorer in self.scorers.items():
+            if self.refs[name] is None:
+                continue
+            stats = scorer.sentence_stats(self.refs[name], idx, hyp)
+            if name not in self.totals:
+                self.stats[name][idx] = stats
+            elif self.totals[name] is None:
+                self.totals[name] = stats
+            else:
+                self.totals[name] = [t + s for t, s in zip(self.totals[name], stats)]
+        self.n_hyps += 1
+
+    def score(self, partial=False):
+        """Return an OrderedDict of the scores of the hypotheses added so
+        far. Only the running scores are returned if partial is True."""
+        scores = OrderedDict()
+        for name, scorer in self.scorers.items():
+            if name in self.totals:
+                if self.totals[name] is None:
+                    scores[name] = scorer.score_stats(self.refs[name], [])
+                else:
+                    scores[name] = scorer.score_totals(self.refs[name], self.totals[name])
+            elif not partial:
+                stats = self.stats[name]
+                scores[name] = scorer.score_stats(self.refs[name], [stats[idx] for idx in sorted(stats)])
+        return scores
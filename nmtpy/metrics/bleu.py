@@ -1,13 +1,22 @@
 # -*- coding: utf-8 -*-
 import os
-import pkg_resources
+import math
 
 from subprocess import Popen, PIPE, check_output
 
-from ..sysutils import real_path, get_temp_file
+from ..sysutils import real_path, get_temp_file, fopen
 from .metric    import Metric
 
-BLEU_SCRIPT = pkg_resources.resource_filename('nmtpy', 'external/multi-bleu.perl')
+# Max n-gram order
+N = 4
+
+# Cooked references per (files, mtimes, lowercase)
+_REF_CACHE = {}
+
+def bleu_script():
+    # pkg_resources is slow to import, only do it when needed
+    import pkg_resources
+    return pkg_resources.resource_filename('nmtpy', 'external/multi-bleu.perl')
 
 class BLEUScore(Metric):
     def __init__(self, score=None):
@@ -23,7 +32,7 @@ class MultiBleuScorer(object):
         # For multi-bleu.perl we give the reference(s) files as argv,
         # while the candidate translations are read from stdin.
         self.lowercase = lowercase
-        self.__cmdline = [BLEU_SCRIPT]
+        self.__cmdline = [bleu_script()]
         if self.lowercase:
             self.__cmdline.append("-lc")
 
@@ -50,3 +59,156 @@ class MultiBleuScorer(object):
             return BLEUScore()
         else:
             return BLEUScore(score[0].rstrip("\n"))
+
+def _chop_lines(data):
+    """Split data into lines like Perl's while(<>) { chop; }: the last
+    character of an unterminated last line is removed as well."""
+    lines = data.split('\n')
+    last = lines.pop()
+    if last:
+        lines.append(last[:-1])
+    return lines
+
+def _ref_files(refs):
+    """Return the reference files that multi-bleu.perl would read and
+    how many of them are found through the first one."""
+    stem = refs[0]
+    if not os.path.exists(stem) and not os.path.exists(stem + '0') \
+            and os.path.exists(stem + '.ref0'):
+        stem += '.ref'
+
+    files = []
+    while os.path.exists('%s%d' % (stem, len(files))):
+        files.append('%s%d' % (stem, len(files)))
+    if os.path.exists(stem):
+        files.append(stem)
+    n_stem = len(files)
+
+    files.extend([r for r in refs[1:] if os.path.exists(r)])
+    return files, n_stem
+
+def _count_ngrams(words):
+    """Return the counts of all 1..N-grams of a list of words."""
+    counts = {}
+    for n in range(1, N + 1):
+        for ngram in zip(*[words[i:] for i in range(n)]):
+            counts[ngram] = counts.get(ngram, 0) + 1
+    return counts
+
+def cook_refs(files, lowercase=False):
+    """Return the reference lengths and the max n-gram counts for each
+    sentence and the number of lines of each file."""
+    key = (tuple(files), tuple([os.stat(f).st_mtime for f in files]), lowercase)
+    if key in _REF_CACHE:
+        return _REF_CACHE[key]
+
+    cooked = []
+    n_lines = []
+    for fname in files:
+        with fopen(fname) as f:
+            lines = _chop_lines(f.read())
+        n_lines.append(len(lines))
+        for idx, line in enumerate(lines):
+            if idx == len(cooked):
+                cooked.append(([], {}))
+            lens, max_counts = cooked[idx]
+            if lowercase:
+                line = line.lower()
+            words = line.split()
+            lens.append(len(words))
+            # Max count of each n-gram among references
+            for ngram, count in _count_ngrams(words).iteritems():
+                if count > max_counts.get(ngram, 0):
+                    max_counts[ngram] = count
+
+    _REF_CACHE[key] = cooked, n_lines
+    return cooked, n_lines
+
+def _log(x):
+    return math.log(x) if x else -9999999999
+
+"""Native BLEU scorer giving the same results as multi-bleu.perl."""
+class BLEUScorer(object):
+    def __init__(self, lowercase=False):
+        self.lowercase = lowercase
+
+    def load_refs(self, refs):
+        """Return the cooked references of each sentence or None
+        if multi-bleu.perl would die reading them."""
+        # Make reference files a list
+        refs = [refs] if isinstance(refs, str) else refs
+
+        files, n_stem = _ref_files(refs)
+        cooked, n_lines = cook_refs(files, self.lowercase)
+        if sum(n_lines[:n_stem]) == 0:
+            # multi-bleu.perl dies if the first reference is not found or empty
+            return None
+        return cooked
+
+    def sentence_stats(self, refs, idx, hyp):
+        """Return the statistics of the idx'th hypothesis: its length, the
+        closest reference length, n-gram matches and n-gram counts."""
+        if self.lowercase:
+            hyp = hyp.lower()
+        words = hyp.split()
+        lens, max_counts = refs[idx] if idx < len(refs) else ([], {})
+
+        # Closest reference length, the shorter one on ties
+        closest_diff, closest_len = 9999, 9999
+        for length in lens:
+            diff = abs(len(words) - length)
+            if diff < closest_diff or (diff == closest_diff and length < closest_len):
+                closest_diff, closest_len = diff, length
+
+        stats = [len(words), closest_len] + [0] * (2 * N)
+        for ngram, count in _count_ngrams(words).iteritems():
+            stats[1 + N + len(ngram)] += count
+            if ngram in max_counts:
+                stats[1 + len(ngram)] += min(count, max_counts[ngram])
+        return stats
+
+    def score_stats(self, refs, stats):
+        """Return the score of a list of sentence statistics."""
+        totals = [sum(col) for col in zip(*stats)] if stats else [0] * (2 + 2 * N)
+        return self.score_totals(refs, totals)
+
+    def score_totals(self, refs, totals):
+        """Return the score of the sum of sentence statistics."""
+        if refs is None:
+            return BLEUScore()
+
+        hyp_len, ref_len = totals[:2]
+        correct = totals[1:2 + N]
+        total = totals[1 + N:]
+
+        precs = [correct[n] / float(total[n]) if total[n] else 0 for n in range(1, N + 1)]
+
+        if ref_len == 0:
+            return BLEUScore("BLEU = 0, 0/0/0/0 (BP=0, ratio=0, hyp_len=0, ref_len=0)")
+
+        bp = 1
+        if hyp_len < ref_len:
+            if hyp_len == 0:
+                # Division by zero in multi-bleu.perl
+                return BLEUScore()
+            bp = math.exp(1 - ref_len / float(hyp_len))
+
+        bleu = bp * math.exp((_log(precs[0]) + _log(precs[1]) + _log(precs[2]) + _log(precs[3])) / 4)
+
+        return BLEUScore("BLEU = %.2f, %.1f/%.1f/%.1f/%.1f (BP=%.3f, ratio=%.3f, hyp_len=%d, ref_len=%d)" % (
+                         100 * bleu, 100 * precs[0], 100 * precs[1], 100 * precs[2], 100 * precs[3],
+                         bp, hyp_len / float(ref_len), hyp_len, ref_len))
+
+    def compute(self, refs, hyps):
+        cooked = self.load_refs(refs)
+        if cooked is None:
+            return BLEUScore()
+
+        if isinstance(hyps, list):
+            data = "\n".join([h.encode('utf-8') if isinstance(h, unicode) else h for h in hyps]) + "\n"
+        else:
+            with open(hyps, "rb") as fhyp:
+                data = fhyp.read()
+
+        lines = _chop_lines(data)
+        return self.score_stats(cooked, [self.sentence_stats(cooked, idx, line) for idx, line in enumerate(lines)])
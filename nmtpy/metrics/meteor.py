@@ -1,12 +1,18 @@
 # -*- coding: utf-8 -*-
 import os
-import pkg_resources
-from subprocess import check_output
+import threading
+from subprocess import Popen, PIPE
 
-from ..sysutils import get_temp_file
 from .metric import Metric
+from .. import cleanup
 
-METEOR_JAR = pkg_resources.resource_filename('nmtpy', 'external/meteor-1.5.jar')
+# Running METEOR processes per (language, norm)
+_DAEMONS = {}
+
+def meteor_jar():
+    # pkg_resources is slow to import, only do it when needed
+    import pkg_resources
+    return pkg_resources.resource_filename('nmtpy', 'external/meteor-1.5.jar')
 
 class METEORScore(Metric):
     def __init__(self, score=None):
@@ -15,55 +21,138 @@ class METEORScore(Metric):
         self.score = (100*score) if score else 0.
         self.score_str = "%.5f" % self.score
 
-class METEORScorer(object):
-    def __init__(self):
-        self.__cmdline = ["java", "-Xmx2G", "-jar", METEOR_JAR]
+"""A METEOR process in -stdio mode kept alive between calls."""
+class METEORDaemon(object):
+    def __init__(self, language, norm=False):
+        self.cmdline = ["java", "-Xmx2G", "-jar", meteor_jar(), "-", "-", "-stdio", "-l", language]
+        if norm:
+            self.cmdline.append("-norm")
 
-    def compute(self, refs, hyps, language="auto", norm=False):
-        cmdline = self.__cmdline[:]
+        self.proc = None
+        # Used to guarantee thread safety
+        self.lock = threading.Lock()
+
+    def __start(self):
+        self.close()
+        self.proc = Popen(self.cmdline, stdin=PIPE, stdout=PIPE, stderr=open(os.devnull, 'w'))
+        cleanup.register_proc(self.proc.pid)
+
+    def __write(self, lines):
+        try:
+            for line in lines:
+                self.proc.stdin.write(line + '\n')
+            self.proc.stdin.flush()
+        except IOError:
+            # Noticed by the reader as well
+            pass
+
+    def __readline(self):
+        line = self.proc.stdout.readline()
+        if not line:
+            raise IOError("METEOR process died")
+        return line.strip()
+
+    def __stats(self, hyps, refs):
+        # Segment statistics, written from another thread so that
+        # neither side blocks on a full pipe
+        lines = [' ||| '.join(['SCORE'] + r + [h.replace('|||', '').replace('  ', ' ')]) for h, r in zip(hyps, refs)]
+        writer = threading.Thread(target=self.__write, args=(lines, ))
+        writer.start()
+        stats = [self.__readline() for line in lines]
+        writer.join()
+        return stats
+
+    def __evaluate(self, stats):
+        # Segment scores and the final score
+        self.__write([' ||| '.join(['EVAL'] + stats)])
+        for stat in stats:
+            self.__readline()
+        return float(self.__readline())
+
+    def __call(self, func, *args):
+        with self.lock:
+            if self.proc is None or self.proc.poll() is not None:
+                self.__start()
+            try:
+                return func(*args)
+            except (IOError, ValueError):
+                # Restart and retry once
+                self.__start()
+                return func(*args)
 
-        if isinstance(hyps, list):
-            # Create a temporary file
-            with get_temp_file(suffix=".hyps") as tmpf:
-                for hyp in hyps:
-                    tmpf.write("%s\n" % hyp)
+    def stats(self, hyps, refs):
+        """Return the statistics lines of hypotheses given a list of references for each."""
+        return self.__call(self.__stats, hyps, refs)
 
-                cmdline.append(tmpf.name)
+    def evaluate(self, stats):
+        """Return the corpus score of the given statistics lines."""
+        return self.__call(self.__evaluate, stats)
 
-        elif isinstance(hyps, str):
-            cmdline.append(hyps)
+    def score(self, hyps, refs):
+        """Return the corpus score of hypotheses given a list of references for each."""
+        return self.__call(lambda: self.__evaluate(self.__stats(hyps, refs)))
 
+    def close(self):
+        if self.proc is not None:
+            try:
+                self.proc.stdin.close()
+            except IOError:
+                pass
+            self.proc.wait()
+            cleanup.unregister_proc(self.proc.pid)
+            self.proc = None
+
+def get_daemon(language, norm=False):
+    """Return the METEOR process for the language and normalization."""
+    key = (language, norm)
+    if key not in _DAEMONS:
+        _DAEMONS[key] = METEORDaemon(language, norm)
+    return _DAEMONS[key]
+
+class METEORScorer(object):
+    def load_refs(self, refs, language="auto", norm=False):
+        """Return the METEOR process and the references of each segment."""
         # Make reference files a list
         refs = [refs] if isinstance(refs, str) else refs
-        n_refs = len(refs)
-        if n_refs > 1:
-            # Multiple references
-            # FIXME: METEOR can consume everything from stdin
-            tmpff = get_temp_file(suffix=".refs")
-            fname = tmpff.name
-            tmpff.close()
-            os.system('paste -d"\\n" %s > %s' % (" ".join(refs), fname))
-            cmdline.append(fname)
-        else:
-            cmdline.append(refs[0])
 
         if language == "auto":
             # Take the extension of the 1st reference file, e.g. ".de"
             language = os.path.splitext(refs[0])[-1][1:]
 
-        cmdline.extend(["-l", language])
-        if norm:
-            cmdline.append("-norm")
+        # List of references for each segment
+        ref_lines = []
+        for ref in refs:
+            with open(ref) as f:
+                ref_lines.append(f.read().splitlines())
+        ref_lines = [list(r) for r in zip(*ref_lines)]
+
+        return get_daemon(language, norm), ref_lines
 
-        if n_refs > 1:
-            # Multiple references
-            cmdline.extend(["-r", str(n_refs)])
+    def sentence_stats(self, refs, idx, hyp):
+        """Return the statistics line of the idx'th hypothesis."""
+        daemon, ref_lines = refs
+        if idx >= len(ref_lines):
+            # Ignored as with compute()
+            return None
+        return daemon.stats([hyp], [ref_lines[idx]])[0]
 
-        output = check_output(cmdline)
+    def score_stats(self, refs, stats):
+        """Return the score of a list of statistics lines."""
+        stats = [s for s in stats if s is not None]
+        if len(stats) == 0:
+            return METEORScore()
+        return METEORScore(refs[0].evaluate(stats))
+
+    def compute(self, refs, hyps, language="auto", norm=False):
+        if isinstance(hyps, str):
+            # Hypotheses is file
+            with open(hyps) as f:
+                hyps = f.read().splitlines()
 
-        score = output.splitlines()
-        if len(score) == 0:
+        daemon, ref_lines = self.load_refs(refs, language, norm)
+
+        if len(hyps) == 0:
             return METEORScore()
-        else:
-            # Final score: 0.320320320320
-            return METEORScore(float(score[-1].split(":")[-1].strip()))
+
+        hyps = hyps[:len(ref_lines)]
+        return self.score_stats((daemon, ref_lines), daemon.stats(hyps, ref_lines[:len(hyps)]))
@@ -38,6 +38,9 @@ class Model(BaseModel):
         # Shuffle mode (default: No shuffle)
         self.smode = kwargs.get('shuffle_mode', 'simple')
 
+        # Max # of padded source + target tokens in a batch for shuffle_mode: bucket
+        self.max_tokens = kwargs.get('max_tokens', 0)
+
         # Get dropout parameters
         # Let's keep the defaults as 0 to not use dropout
         # You can adjust those from your conf files.
@@ -225,6 +228,128 @@ class Model(BaseModel):
 
         return final_sample, final_score, final_alignments
 
+    @staticmethod
+    def greedy_search(inputs, f_inits, f_nexts, maxlen=50, suppress_unks=False, **kwargs):
+        """Greedy decoding which also returns the smallest margin between the
+        best and the second best log-probabilities seen along the way. The
+        other return values follow the format of beam_search()."""
+        sample      = []
+        score       = 0.
+        alignments  = []
+        min_margin  = np.inf
+
+        # Number of models
+        n_models    = len(f_inits)
+
+        # Ensembling-aware lists
+        next_states = [None] * n_models
+        text_ctxs   = [None] * n_models
+        aux_ctxs    = [[]] * n_models
+        next_log_ps = [None] * n_models
+        alphas      = [None] * n_models
+
+        for i, f_init in enumerate(f_inits):
+            result = list(f_init(*inputs))
+            next_states[i], text_ctxs[i], aux_ctxs[i] = result[0], result[1], result[2:]
+
+        # Beginning-of-sentence indicator is -1
+        next_w = -1 * np.ones((1,), dtype=INT)
+
+        # maxlen or 3 times source length
+        maxlen = min(maxlen, inputs[0].shape[0] * 3)
+
+        for t in range(maxlen):
+            for m, f_next in enumerate(f_nexts):
+                next_log_ps[m], next_states[m], alphas[m] = f_next(*([next_w, next_states[m], text_ctxs[m]] + aux_ctxs[m]))
+
+                if suppress_unks:
+                    next_log_ps[m][:, 1] = -np.inf
+
+            log_p = sum(next_log_ps)[0]
+
+            # Best two candidates, margin is computed on the mean model
+            top2 = log_p.argpartition(-2)[-2:]
+            wi, second = (top2[1], top2[0]) if log_p[top2[1]] >= log_p[top2[0]] else (top2[0], top2[1])
+            min_margin = min(min_margin, (log_p[wi] - log_p[second]) / n_models)
+
+            sample.append(wi)
+            score -= log_p[wi]
+            alignments.append((sum(alphas) / n_models)[0])
+
+            # <eos>
+            if wi == 0:
+                break
+
+            next_w = np.array([wi], dtype=INT)
+
+        if not kwargs.get('get_att_alphas', False):
+            return [sample], [score], None, min_margin
+
+        return [sample], [score], [alignments], min_margin
+
+    @staticmethod
+    def rescore(inputs, f_inits, f_nexts, hyps, **kwargs):
+        """Return a (n_hyps, n_models) array of negative log-probabilities for
+        hyps, a list of target idx sequences without <eos>, given the source.
+
+        The source is encoded once per model and the hypotheses are walked
+        through as a prefix trie: every distinct prefix is fed to f_next only
+        once and all the prefixes of the same length are fed as a single batch."""
+        n_models = len(f_inits)
+
+        # Append <eos> as it is scored as well
+        hyps    = [list(h) + [0] for h in hyps]
+        scores  = np.zeros((len(hyps), n_models), dtype=FLOAT)
+
+        # Ensembling-aware lists
+        states      = [None] * n_models
+        text_ctxs   = [None] * n_models
+        aux_ctxs    = [[]] * n_models
+        log_ps      = [None] * n_models
+
+        for i, f_init in enumerate(f_inits):
+            result = list(f_init(*inputs))
+            states[i], text_ctxs[i], aux_ctxs[i] = result[0], result[1], result[2:]
+
+        # Trie nodes of the current depth: each node is the list of hyp idxs
+        # sharing the same prefix. The root node holds every hypothesis.
+        nodes   = [list(range(len(hyps)))]
+
+        # Beginning-of-sentence indicator is -1
+        next_w  = -1 * np.ones((1,), dtype=INT)
+
+        t = 0
+        while len(nodes) > 0:
+            # Feed the last words of all the prefixes at once
+            tiled_ctxs = [np.tile(ctx, [len(nodes), 1]) for ctx in text_ctxs]
+            for m, f_next in enumerate(f_nexts):
+                log_ps[m], states[m], _ = f_next(*([next_w, states[m], tiled_ctxs[m]] + aux_ctxs[m]))
+
+            # Score the t'th words and expand the nodes with their children
+            new_nodes   = []
+            new_words   = []
+            parents     = []
+            for n, idxs in enumerate(nodes):
+                children = OrderedDict()
+                for i in idxs:
+                    w = hyps[i][t]
+                    scores[i] -= [log_p[n, w] for log_p in log_ps]
+                    # Hypothesis is complete once <eos> is scored
+                    if w != 0:
+                        children.setdefault(w, []).append(i)
+
+                for w, cidxs in children.items():
+                    new_nodes.append(cidxs)
+                    new_words.append(w)
+                    parents.append(n)
+
+            nodes   = new_nodes
+            next_w  = np.array(new_words, dtype=INT)
+            states  = [st[parents] for st in states]
+            t += 1
+
+        return scores
+
     def info(self):
         self.logger.info('Source vocabulary size: %d', self.n_words_src)
         self.logger.info('Target vocabulary size: %d', self.n_words_trg)
@@ -257,6 +382,7 @@ class Model(BaseModel):
         self.train_iterator = BiTextIterator(
                                 batch_size=self.batch_size,
                                 shuffle_mode=self.smode,
+                                max_tokens=self.max_tokens,
                                 logger=self.logger,
                                 srcfile=self.data['train_src'], srcdict=self.src_dict,
                                 trgfile=self.data['train_trg'], trgdict=self.trg_dict,
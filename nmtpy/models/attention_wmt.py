@@ -59,6 +59,7 @@ class Model(Attention):
         self.train_iterator = WMTIterator(
                 batch_size=self.batch_size,
                 shuffle_mode=self.smode,
+                max_tokens=self.max_tokens,
                 logger=self.logger,
                 pklfile=self.data['train_src'],
                 trgdict=self.trg_dict, srcdict=self.src_dict,
@@ -42,6 +42,56 @@ class Model(Attention):
         self.init_gru_decoder   = None
         self.gru_decoder        = None
 
+    @staticmethod
+    def beam_search(inputs, f_inits, f_nexts, beam_size=12, maxlen=50, suppress_unks=False,
+                    img_topk=0, img_rank='alpha', **kwargs):
+        # Optionally shrink the image context once before decoding
+        if img_topk > 0:
+            f_inits = [Model.prune_img_ctx(inputs, f_init, f_next, img_topk, img_rank) \
+                        for f_init, f_next in zip(f_inits, f_nexts)]
+
+        return Attention.beam_search(inputs, f_inits, f_nexts, beam_size=beam_size, maxlen=maxlen,
+                                     suppress_unks=suppress_unks, **kwargs)
+
+    @staticmethod
+    def greedy_search(inputs, f_inits, f_nexts, maxlen=50, suppress_unks=False,
+                      img_topk=0, img_rank='alpha', **kwargs):
+        # Same image context as beam_search()
+        if img_topk > 0:
+            f_inits = [Model.prune_img_ctx(inputs, f_init, f_next, img_topk, img_rank) \
+                        for f_init, f_next in zip(f_inits, f_nexts)]
+
+        return Attention.greedy_search(inputs, f_inits, f_nexts, maxlen=maxlen,
+                                       suppress_unks=suppress_unks, **kwargs)
+
+    @staticmethod
+    def prune_img_ctx(inputs, f_init, f_next, k, rank='alpha'):
+        """Return an f_init replacement whose image context only
+        keeps the k highest ranked regions of the image.
+
+        rank='alpha' ranks regions by their attention weights at the first
+        decoding step while rank='norm' ranks them by the L2 norm of
+        their projected features."""
+        init_state, text_ctx, img_ctx = f_init(*inputs)
+        n_regions = img_ctx.shape[0]
+
+        if k < n_regions:
+            if rank == 'alpha':
+                # Beginning-of-sentence indicator is -1
+                next_w = -1 * np.ones((1,), dtype=INT)
+                # Image alphas come after the textual ones
+                alphas = f_next(next_w, init_state, text_ctx, img_ctx)[2]
+                scores = alphas[0, -n_regions:]
+            else:
+                scores = np.sqrt((img_ctx[:, 0] ** 2).sum(-1))
+
+            # Keep the spatial order of the selected regions
+            idxs    = np.sort(np.argpartition(-scores, k - 1)[:k])
+            img_ctx = img_ctx[idxs]
+
+        result = [init_state, text_ctx, img_ctx]
+        return lambda *args: result
+
     def info(self):
         self.logger.info('Source vocabulary size: %d', self.n_words_src)
         self.logger.info('Target vocabulary size: %d', self.n_words_trg)
@@ -59,6 +109,7 @@ class Model(Attention):
         self.train_iterator = WMTIterator(
                 batch_size=self.batch_size,
                 shuffle_mode=self.smode,
+                max_tokens=self.max_tokens,
                 logger=self.logger,
                 pklfile=self.data['train_src'],
                 imgfile=self.data['train_img'],
@@ -52,14 +52,31 @@ class BaseModel(object):
         self.train_iterator = None
         self.valid_iterator = None
 
+        # Padded validation minibatches reused by val_loss()
+        # (False if not supported by the iterator)
+        self.valid_batches  = None
+
         # A theano shared variable for lrate annealing
         self.learning_rate  = None
 
+        # Shared variables of the optimizer, e.g. moment estimates
+        self.opt_state      = []
+
     @staticmethod
     def beam_search(inputs, f_inits, f_nexts, beam_size=12, maxlen=50, suppress_unks=False, **kwargs):
         # Override this from your classes
         pass
 
+    @staticmethod
+    def greedy_search(inputs, f_inits, f_nexts, maxlen=50, suppress_unks=False, **kwargs):
+        # Override this from your classes
+        pass
+
+    @staticmethod
+    def rescore(inputs, f_inits, f_nexts, hyps, **kwargs):
+        # Override this from your classes
+        pass
+
     def set_options(self, optdict):
         """Filter out None's and save option dict."""
         self.options = OrderedDict([(k,v) for k,v in optdict.items() if v is not None])
@@ -80,7 +97,7 @@ class BaseModel(object):
         # Update model's value
         self.lrate = lrate
         # Update shared variable used withing the optimizer
-        self.learning_rate.set_value(self.lrate)
+        self.learning_rate.set_value(np.float64(self.lrate).astype(FLOAT))
 
     def get_nb_params(self):
         """Return the number of parameters of the model."""
@@ -91,12 +108,42 @@ class BaseModel(object):
         for k in self.tparams.keys():
             self.tparams[k].set_value(updates[k])
 
-    def save(self, fname):
-        """Save model parameters as .npz."""
+    def snapshot(self):
+        """Return an in-memory copy of what save() writes."""
         if self.tparams is not None:
-            np.savez(fname, tparams=unzip(self.tparams), opts=self.options)
+            return {'tparams': unzip(self.tparams), 'opts': self.options}
         else:
-            np.savez(fname, opts=self.options)
+            return {'opts': self.options}
+
+    def save(self, fname):
+        """Save model parameters as .npz."""
+        np.savez(fname, **self.snapshot())
+
+    def get_state(self):
+        """Return parameters, optimizer and RNG states to resume training."""
+        state = {'tparams'  : unzip(self.tparams),
+                 'opt_state': [v.get_value() for v in self.opt_state],
+                 'lrate'    : float(self.learning_rate.get_value()),
+                 'trng'     : None}
+
+        if getattr(self, 'trng', None) is not None:
+            state['trng'] = [u[0].get_value() for u in self.trng.state_updates]
+
+        return state
+
+    def set_state(self, state):
+        """Restore a state returned by get_state()."""
+        self.init_shared_variables(_from=state['tparams'])
+
+        assert len(self.opt_state) == len(state['opt_state']), "Optimizer state mismatch"
+        for var, value in zip(self.opt_state, state['opt_state']):
+            var.set_value(value)
+
+        self.update_lrate(state['lrate'])
+
+        if state['trng'] is not None:
+            for u, value in zip(self.trng.state_updates, state['trng']):
+                u[0].set_value(value)
 
     def load(self, fname):
         """Restore .npz checkpoint file into model."""
@@ -122,8 +169,23 @@ class BaseModel(object):
                 # Let this fail if _from doesn't match the model
                 self.tparams[kk].set_value(_from[kk])
 
+    def get_valid_batches(self):
+        """Return the length-sorted validation minibatches, prepared once."""
+        if self.valid_batches is None:
+            get_batches = getattr(self.valid_iterator, 'get_sorted_batches', lambda: None)
+            self.valid_batches = get_batches() or False
+        return self.valid_batches
+
     def val_loss(self):
         """Compute validation loss."""
+        if self.get_valid_batches():
+            # Put back the losses in corpus order for an identical mean
+            probs = np.zeros((self.valid_iterator.n_samples, ), dtype=FLOAT)
+            for idxs, data in self.valid_batches:
+                norm = data['y_mask'].sum(0) if 'y_mask' in data else 1
+                probs[idxs] = self.f_log_probs(*data.values()) / norm
+            return probs.mean()
+
         probs = []
 
         # dict of x, x_mask, y, y_mask
@@ -159,8 +221,10 @@ class BaseModel(object):
                                            g))
         return new_grads
 
-    def build_optimizer(self, cost, regcost, clip_c, dont_update=None, debug=False):
-        """Build optimizer by optionally disabling learning for some weights."""
+    def build_optimizer(self, cost, regcost, clip_c, dont_update=None, debug=False, accum_steps=1):
+        """Build optimizer by optionally disabling learning for some weights.
+        If accum_steps > 1, accum_grads() sums the gradients of minibatches
+        and apply_grads(n) updates the parameters with their mean instead of train_batch()."""
         tparams = OrderedDict(self.tparams)
 
         # Filter out weights that we do not want to update during backprop
@@ -189,6 +253,19 @@ class BaseModel(object):
         # This uses final_cost which is not normalized w.r.t sentence lengths
         grads = tensor.grad(final_cost, wrt=tparams.values())
 
+        if accum_steps > 1:
+            # Gradients are summed into these and averaged before the update
+            self.grad_bufs = [theano.shared(np.zeros_like(p.get_value()), name='%s_grad' % p.name)
+                              for p in tparams.values()]
+            accum_updates = [(b, b + g) for b, g in zip(self.grad_bufs, grads)]
+
+            # Number of accumulated minibatches
+            n_accum = tensor.scalar('n_accum', dtype=FLOAT)
+            grads = [b / n_accum for b in self.grad_bufs]
+
+        # Norm of the gradients before clipping
+        grad_norm = tensor.sqrt(sum([(g**2).sum() for g in grads]))
+
         # Clip gradients if requested
         if clip_c > 0:
             grads = self.get_clipped_grads(grads, clip_c)
@@ -203,8 +280,24 @@ class BaseModel(object):
         # Get updates
         updates = opt(tparams, grads, self.inputs.values(), final_cost, lr0=self.learning_rate)
 
+        # Keep the optimizer variables around for checkpointing
+        params = set(self.tparams.values())
+        self.opt_state = [var for var, _ in updates if var not in params]
+
+        # Keep the gradient norm of the last update for monitoring
+        self.grad_norm = theano.shared(np.float64(0.).astype(FLOAT), name='grad_norm')
+        updates.append((self.grad_norm, grad_norm))
+
+        if accum_steps > 1:
+            # Compile forward/backward and update functions separately
+            self.train_batch = None
+            self.accum_grads = theano.function(self.inputs.values(), norm_cost, updates=accum_updates)
+            # Reset the buffers after the update
+            updates += [(b, tensor.zeros_like(b)) for b in self.grad_bufs]
+            self.apply_grads = theano.function([n_accum], [], updates=updates,
+                                               allow_input_downcast=True)
         # Compile forward/backward function
-        if debug:
+        elif debug:
             self.train_batch = theano.function(self.inputs.values(), norm_cost, updates=updates,
                                                mode=theano.compile.MonitorMode(
                                                    pre_func=inspect_inputs,
@@ -226,6 +319,17 @@ class BaseModel(object):
 
         return result
 
+    def translate_valid(self, beam_size=12, n_jobs=8, mode='beamsearch', valid_mode='single'):
+        """Save model under /tmp for passing it to nmt-translate and return
+        the hypotheses file and the reference files of the validation set."""
+        with get_temp_file(suffix=".npz", delete=True) as tmpf:
+            self.save(tmpf.name)
+            return get_valid_hyps(tmpf.name,
+                                  beam_size=beam_size,
+                                  n_jobs=n_jobs,
+                                  mode=mode,
+                                  valid_mode=valid_mode)
+
     def gen_sample(self, input_dict, maxlen=50, argmax=False):
         """Generate samples, do greedy (argmax) decoding or forced decoding."""
         # A method that samples or takes the max proba's or
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import ctypes
+import signal
+from multiprocessing import Process, Pipe
+from multiprocessing.sharedctypes import RawArray
+
+import numpy as np
+import theano
+
+from .defaults import FLOAT
+from . import cleanup
+
+def _shared_arrays(arrays):
+    """Return shared memory arrays with the shapes of the given ones."""
+    sizes = [a.size for a in arrays]
+    raw = RawArray(ctypes.c_byte, sum(sizes) * np.dtype(FLOAT).itemsize)
+    flat = np.frombuffer(raw, dtype=FLOAT)
+
+    offsets = np.cumsum([0] + sizes)
+    return [flat[b:e].reshape(a.shape) for a, b, e in zip(arrays, offsets[:-1], offsets[1:])]
+
+"""Data-parallel gradient computation in forked worker processes.
+
+The parameters are written to shared memory and each worker adds the
+gradients of its minibatch to its own shared buffer which is then summed
+into the grad_bufs of the model. The model should be built with
+build_optimizer(accum_steps > 1). As worker processes inherit the
+compiled functions through fork(), this is meant for CPU training."""
+class GradientWorkers(object):
+    def __init__(self, model, n_workers, seed=1234):
+        if theano.config.device != 'cpu':
+            raise RuntimeError('GradientWorkers can only be used on the CPU (device is %s).' % theano.config.device)
+
+        self.model      = model
+        # The calling process computes the gradients of the first minibatch
+        self.n_workers  = n_workers
+        self.seed       = seed
+
+        params = [p.get_value(borrow=True) for p in self.model.tparams.values()]
+        grads  = [b.get_value(borrow=True) for b in self.model.grad_bufs]
+
+        self.__params   = _shared_arrays(params)
+        self.__grads    = [_shared_arrays(grads) for i in range(self.n_workers - 1)]
+        self.__conns    = []
+        self.__procs    = []
+
+        for idx in range(self.n_workers - 1):
+            conn, child_conn = Pipe()
+            proc = Process(target=self.__work, args=(idx, child_conn))
+            proc.start()
+            cleanup.register_proc(proc.pid)
+            self.__conns.append(conn)
+            self.__procs.append(proc)
+
+    def __work(self, idx, conn):
+        """Worker process loop."""
+        # Let cleanup terminate us
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+        # Different dropout masks for each worker
+        if getattr(self.model, 'trng', None) is not None:
+            self.model.trng.seed(self.seed + idx + 1)
+
+        grads = self.__grads[idx]
+        while True:
+            data = conn.recv()
+            if data is None:
+                break
+            elif isinstance(data, tuple):
+                # ('get_rng', ) or ('set_rng', state)
+                if data[0] == 'get_rng':
+                    conn.send(self.__get_rng())
+                else:
+                    self.__set_rng(data[1])
+                continue
+
+            try:
+                for p, v in zip(self.model.tparams.values(), self.__params):
+                    p.set_value(v)
+
+                loss = self.model.accum_grads(*data.values())
+
+                for b, g in zip(self.model.grad_bufs, grads):
+                    g[:] = b.get_value(borrow=True)
+                    b.set_value(np.zeros_like(g))
+            except Exception as e:
+                # Re-raised in the calling process
+                loss = e
+            conn.send(loss)
+
+    def __get_rng(self):
+        """Return the dropout RNG state of this process."""
+        if getattr(self.model, 'trng', None) is None:
+            return None
+        return [u[0].get_value() for u in self.model.trng.state_updates]
+
+    def __set_rng(self, state):
+        """Restore a dropout RNG state returned by __get_rng()."""
+        if state is not None:
+            for u, value in zip(self.model.trng.state_updates, state):
+                u[0].set_value(value)
+
+    def get_rng_states(self):
+        """Return the dropout RNG states of the worker processes."""
+        states = []
+        for conn in self.__conns:
+            conn.send(('get_rng', ))
+            states.append(conn.recv())
+        return states
+
+    def set_rng_states(self, states):
+        """Restore the RNG states returned by get_rng_states()."""
+        for conn, state in zip(self.__conns, states):
+            conn.send(('set_rng', state))
+
+    def accum_grads(self, batches):
+        """Add the gradients of at most n_workers minibatches to the
+        grad_bufs of the model and return their losses."""
+        assert 0 < len(batches) <= self.n_workers, "Too many minibatches"
+
+        # Broadcast the current parameters
+        for p, v in zip(self.model.tparams.values(), self.__params):
+            v[:] = p.get_value(borrow=True)
+
+        for conn, data in zip(self.__conns, batches[1:]):
+            conn.send(data)
+
+        losses = [self.model.accum_grads(*batches[0].values())]
+
+        for conn, grads in zip(self.__conns, self.__grads)[:len(batches) - 1]:
+            loss = conn.recv()
+            if isinstance(loss, Exception):
+                raise loss
+            losses.append(loss)
+
+            for b, g in zip(self.model.grad_bufs, grads):
+                b.set_value(b.get_value(borrow=True) + g)
+
+        return losses
+
+    def close(self):
+        """Stop the worker processes."""
+        for conn, proc in zip(self.__conns, self.__procs):
+            conn.send(None)
+            proc.join()
+            cleanup.unregister_proc(proc.pid)
+        self.__conns, self.__procs = [], []
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import importlib
+
+from collections import OrderedDict
+
+import numpy as np
+
+from .nmtutils import sent_to_idx, idx_to_sent
+from .filters import get_filter
+from .defaults import INT
+
+class TranslationModel(object):
+    """An in-process translator for text-only models. The models are
+    loaded and their samplers compiled once, then reused across calls.
+
+    Usage:
+        tm = TranslationModel(['en-de.npz'], beam_size=12)
+        hyps = tm.translate(['a man is riding a bike .'])
+    """
+    def __init__(self, model_files, beam_size=12, suppress_unks=False, seed=1234):
+        self.model_files    = [os.path.abspath(m) for m in model_files]
+        self.beam_size      = beam_size
+        self.suppress_unks  = suppress_unks
+
+        self.models         = []
+        self.filters        = []
+
+        for mfile in self.model_files:
+            model_options = dict(np.load(mfile)['opts'].tolist())
+            Model = importlib.import_module("nmtpy.models.%s" % model_options['model_type']).Model
+
+            model = Model(seed=seed, logger=None, **model_options)
+            model.load(mfile)
+            model.set_dropout(False)
+            model.build_sampler()
+            self.models.append(model)
+
+        # Target vocabularies should all be same for ensembling
+        assert len(set([len(m.trg_dict) for m in self.models])) == 1
+
+        if "filter" in model_options:
+            self.filters.append(get_filter(model_options['filter']))
+
+        self.f_inits = [m.f_init for m in self.models]
+        self.f_nexts = [m.f_next for m in self.models]
+
+        # Memory footprint of the parameters in bytes. Compiled functions
+        # and Theano/Python overhead are not counted.
+        self.n_bytes = sum([p.get_value(borrow=True).nbytes \
+                                for m in self.models for p in m.tparams.values()])
+
+    def translate_one(self, sentence):
+        """Translate a tokenized source sentence, returns (hyp, score)."""
+        model = self.models[0]
+        seq = sent_to_idx(model.src_dict, sentence.split(), model.n_words_src)
+
+        # (n_timesteps + <eos>, 1) source like TextIterator with mask=False
+        x = np.zeros((len(seq) + 1, 1), dtype=INT)
+        x[:len(seq), 0] = seq
+
+        trans, score, _ = model.beam_search([x], self.f_inits, self.f_nexts,
+                                            beam_size=self.beam_size,
+                                            suppress_unks=self.suppress_unks)
+
+        # Normalize scores according to sequence lengths
+        score = score / np.array([len(s) for s in trans])
+        best = np.argmin(score)
+
+        hyp = idx_to_sent(model.trg_idict, trans[best])
+        for filt in self.filters:
+            hyp = filt(hyp)
+        return hyp, score[best]
+
+    def translate(self, sentences):
+        """Translate a list of tokenized source sentences. Duplicate
+        sentences are decoded once."""
+        cache = {}
+        hyps = []
+        for sent in sentences:
+            if sent not in cache:
+                cache[sent] = self.translate_one(sent)[0]
+            hyps.append(cache[sent])
+        return hyps
+
+class ModelRegistry(object):
+    """Loads translation models on demand and keeps them in memory
+    until max_mb is exceeded, evicting least recently used models.
+    Only the parameters count towards max_mb, so the process uses more
+    memory than that for the compiled samplers of each model."""
+    def __init__(self, max_mb=4096, logger=None):
+        self.max_bytes  = max_mb * 1024 * 1024
+        self.logger     = logger
+
+        # key -> TranslationModel in least to most recently used order
+        self.models     = OrderedDict()
+
+    def _print(self, msg):
+        if self.logger:
+            self.logger.info(msg)
+
+    @staticmethod
+    def key(model_files, **options):
+        """Registry key of models loaded with given options."""
+        return (tuple(os.path.abspath(m) for m in model_files),
+                tuple(sorted(options.items())))
+
+    def n_bytes(self):
+        """Total memory used by the parameters of loaded models."""
+        return sum([m.n_bytes for m in self.models.values()])
+
+    def get(self, model_files, **options):
+        """Return a loaded TranslationModel, loading it if necessary."""
+        key = ModelRegistry.key(model_files, **options)
+
+        if key in self.models:
+            # Mark as most recently used
+            self.models[key] = self.models.pop(key)
+            return self.models[key]
+
+        start = time.time()
+        tmodel = TranslationModel(model_files, **options)
+        self._print("Loaded %s in %.2f seconds (%.1f MB)" % (", ".join(key[0]), time.time() - start,
+                                                            tmodel.n_bytes / 1024. / 1024.))
+        self.models[key] = tmodel
+
+        # Evict old models but always keep the requested one
+        while len(self.models) > 1 and self.n_bytes() > self.max_bytes:
+            old_key, _ = self.models.popitem(last=False)
+            self._print("Evicted %s" % ", ".join(old_key[0]))
+
+        return tmodel
+
+    def evict(self, model_files, **options):
+        """Remove a model from the registry if it is loaded."""
+        self.models.pop(ModelRegistry.key(model_files, **options), None)
+
+    def translate(self, model_files, sentences, **options):
+        """Translate a list of tokenized source sentences."""
+        return self.get(model_files, **options).translate(sentences)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+"""Learning rate schedulers driven by MainLoop.
+
+step() is called after each update with the number of updates done
+(and with 0 before training) and validated() after each validation.
+Both return the new learning rate or None if unchanged."""
+class Scheduler(object):
+    # Reload the best parameters when validated() changes the lrate
+    restart = False
+
+    def __init__(self, lrate, logger, factor=0.5, patience=2, freq=10000,
+                 warmup=4000, min_lrate=1e-6):
+        self.lrate      = lrate
+        self.lrate0     = lrate
+        self.factor     = factor
+        self.patience   = patience
+        self.freq       = freq
+        self.warmup     = warmup
+        self.min_lrate  = min_lrate
+        self.n_decays   = 0
+
+        self._log       = logger
+
+    def _decay(self, reason):
+        """Multiply lrate by factor unless min_lrate is reached."""
+        lrate = max(self.lrate * self.factor, self.min_lrate)
+        if lrate == self.lrate:
+            return None
+
+        self._log.info('Learning rate %.3e -> %.3e (%s)' % (self.lrate, lrate, reason))
+        self.lrate = lrate
+        self.n_decays += 1
+        return self.lrate
+
+    def step(self, uctr):
+        return None
+
+    def validated(self, is_best):
+        return None
+
+    def get_state(self):
+        """Return the scheduler state to be saved with training state."""
+        return dict([(k, v) for k, v in self.__dict__.items() if k != '_log'])
+
+    def set_state(self, state):
+        self.__dict__.update(state)
+
+class PlateauScheduler(Scheduler):
+    """Decay lrate after patience validations without improvement."""
+    def __init__(self, lrate, logger, **kwargs):
+        super(PlateauScheduler, self).__init__(lrate, logger, **kwargs)
+        self.n_bad = 0
+
+    def validated(self, is_best):
+        if is_best:
+            self.n_bad = 0
+            return None
+
+        self.n_bad += 1
+        if self.n_bad < self.patience:
+            return None
+
+        self.n_bad = 0
+        return self._decay('%d validations without improvement' % self.patience)
+
+class RestartScheduler(PlateauScheduler):
+    """Same as plateau but training restarts from the best parameters."""
+    restart = True
+
+class StepScheduler(Scheduler):
+    """Decay lrate every freq updates."""
+    def step(self, uctr):
+        if uctr > 0 and uctr % self.freq == 0:
+            return self._decay('step decay at update %d' % uctr)
+
+class InvSqrtScheduler(Scheduler):
+    """Linear warmup to lrate during warmup updates, then decay
+    proportional to the inverse square root of the update count."""
+    def step(self, uctr):
+        # lrate of the next update
+        n = uctr + 1
+        self.lrate = self.lrate0 * min(n / float(self.warmup), np.sqrt(self.warmup / float(n)))
+        if n == self.warmup:
+            self._log.info('Learning rate warmup finished at update %d (%.3e)' % (n, self.lrate))
+        return self.lrate
+
+def get_scheduler(name):
+    schedulers = {
+                    'plateau'   : PlateauScheduler,
+                    'restart'   : RestartScheduler,
+                    'step'      : StepScheduler,
+                    'invsqrt'   : InvSqrtScheduler,
+                 }
+    return schedulers[name]
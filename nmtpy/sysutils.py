@@ -4,7 +4,9 @@ import sys
 import copy
 import gzip
 import tempfile
+import threading
 import subprocess
+from multiprocessing import Process, Pipe
 
 from . import cleanup
 
@@ -114,6 +116,55 @@ def readable_size(n):
             break
     return '%.1f%s' % (size, fmt)
 
+def run_concurrently(funcs, fork=False):
+    """Call each function in a separate thread (or forked process if fork is True)
+    and return their results in order. Exceptions are re-raised in the caller."""
+    def _call(func):
+        try:
+            return (True, func())
+        except Exception as e:
+            return (False, e)
+
+    def _child(func, conn):
+        conn.send(_call(func))
+        conn.close()
+        # Skip the atexit handlers of the parent
+        os._exit(0)
+
+    results = [None] * len(funcs)
+    if fork:
+        jobs = []
+        for func in funcs:
+            conn, child_conn = Pipe(False)
+            proc = Process(target=_child, args=(func, child_conn))
+            proc.start()
+            # Only the child writes, recv() then fails if it dies
+            child_conn.close()
+            cleanup.register_proc(proc.pid)
+            jobs.append((conn, proc))
+
+        for idx, (conn, proc) in enumerate(jobs):
+            try:
+                results[idx] = conn.recv()
+            except EOFError:
+                results[idx] = (False, RuntimeError("Process %d died" % proc.pid))
+            proc.join()
+            cleanup.unregister_proc(proc.pid)
+    else:
+        def _thread(idx):
+            results[idx] = _call(funcs[idx])
+
+        threads = [threading.Thread(target=_thread, args=(idx, )) for idx in range(len(funcs))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    for ok, result in results:
+        if not ok:
+            raise result
+    return [result for ok, result in results]
+
 def get_temp_file(suffix="", name=None, delete=False):
     """Creates a temporary file under /tmp."""
     if name:
@@ -142,6 +193,23 @@ def get_valid_evaluation(save_path, beam_size, n_jobs, metric, mode, valid_mode=
     results = eval(out.splitlines()[-1].strip())
     return results[metric]
 
+def get_valid_hyps(save_path, beam_size, n_jobs, mode, valid_mode='single'):
+    """Run nmt-translate for validation during training and return the
+    hypotheses file and the reference files to score them in this process."""
+    hypf = get_temp_file(suffix=".valid_hyps")
+    hypf.close()
+
+    cmd = ["nmt-translate", "-b", str(beam_size), "-D", mode, "-j", str(n_jobs),
+           "-m", save_path, "-v", valid_mode, "-o", hypf.name, "--no-metrics"]
+
+    # nmt-translate will print a dict with the reference files
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=sys.stdout)
+    cleanup.register_proc(p.pid)
+    out, err = p.communicate()
+    cleanup.unregister_proc(p.pid)
+    results = eval(out.splitlines()[-1].strip())
+    return hypf.name, results['refs']
+
 def create_gpu_lock(used_gpu):
     """Create a lock file for GPU reservation."""
     name = "gpu_lock.pid%d.gpu%s" % (os.getpid(), used_gpu)
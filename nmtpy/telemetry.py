@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+import resource
+
+from collections import OrderedDict
+
+"""Accumulates training throughput statistics and appends
+them to a file as one JSON object per line."""
+class Telemetry(object):
+    def __init__(self, fname):
+        self.fname = fname
+        self.__fd = open(self.fname, 'a')
+        self.reset()
+
+    def reset(self):
+        """Start a new interval."""
+        self.start      = time.time()
+        self.n_updates  = 0
+        self.n_sents    = 0
+        self.src_tokens = 0
+        self.trg_tokens = 0
+        # Including padding
+        self.n_padded   = 0
+        # Seconds spent waiting for data, in forward/backward and validation
+        self.times      = OrderedDict([('data', 0.), ('train', 0.), ('valid', 0.)])
+
+    def add_batch(self, data):
+        """Count the sentences and tokens of a minibatch."""
+        masks = [v for k, v in data.items() if k.endswith('_mask')]
+        if len(masks) == 0:
+            return
+
+        # Target mask comes last, e.g. x_mask, y_mask
+        self.n_sents += masks[-1].shape[1]
+        self.trg_tokens += int(masks[-1].sum())
+        if len(masks) > 1:
+            self.src_tokens += int(masks[0].sum())
+        self.n_padded += sum([m.size for m in masks])
+
+    def write(self, update, epoch, **fields):
+        """Write the statistics of the interval along with the given fields."""
+        elapsed = time.time() - self.start
+        n_tokens = self.src_tokens + self.trg_tokens
+
+        record = OrderedDict([('update', update), ('epoch', epoch)])
+        record.update(sorted(fields.items()))
+        record['time']          = time.time()
+        record['elapsed']       = elapsed
+        record['updates']       = self.n_updates
+        record['updates_sec']   = self.n_updates / elapsed
+        record['sents_sec']     = self.n_sents / elapsed
+        record['src_tok_sec']   = self.src_tokens / elapsed
+        record['trg_tok_sec']   = self.trg_tokens / elapsed
+        record['padding']       = 1 - n_tokens / float(self.n_padded) if self.n_padded > 0 else None
+        for key, value in self.times.items():
+            record['time_%s' % key] = value
+        record['time_other']    = elapsed - sum(self.times.values())
+        # KB on Linux
+        record['peak_rss_mb']   = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+        self.__fd.write(json.dumps(record) + '\n')
+        self.__fd.flush()
+        self.reset()
+
+    def close(self):
+        self.__fd.close()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+import os
+import cPickle
+
+from collections import defaultdict
+
+def edit_distance(a, b):
+    """Token-level Levenshtein distance between two sequences."""
+    if len(a) < len(b):
+        a, b = b, a
+
+    prev = list(range(len(b) + 1))
+    for i, ta in enumerate(a):
+        cur = [i + 1]
+        for j, tb in enumerate(b):
+            cur.append(min(prev[j + 1] + 1, cur[j] + 1, prev[j] + (ta != tb)))
+        prev = cur
+    return prev[-1]
+
+def fuzzy_score(a, b):
+    """Fuzzy match score in [0, 1] between two token sequences."""
+    maxlen = max(len(a), len(b))
+    if maxlen == 0:
+        return 1.
+    return 1. - edit_distance(a, b) / float(maxlen)
+
+def bigrams(seq):
+    """Return the set of bigrams of a sequence padded with boundaries."""
+    seq = (-1, ) + tuple(seq) + (-2, )
+    return set(zip(seq[:-1], seq[1:]))
+
+class TranslationMemory(object):
+    """Fuzzy translation memory over source token idx sequences.
+
+    Entries are indexed by their bigrams and appended to an on-disk
+    file as soon as they are added, so that the memory grows across
+    runs without being rewritten. A lookup gathers candidates from the
+    rarest bigrams of the query and computes the fuzzy match score
+    only for the best few of them. Bigrams seen in more than
+    max_postings entries are too common to be useful and are not
+    indexed further nor used by lookups, which bounds their work."""
+    def __init__(self, filename, threshold=1.0, header=None, max_grams=8, max_cands=5,
+                 max_postings=1000):
+        self.filename   = filename
+        self.threshold  = threshold
+        self.header     = header if header else {}
+        self.max_grams  = max_grams
+        self.max_cands  = max_cands
+        self.max_postings = max_postings
+
+        # Entries are (src, hyp, score) tuples
+        self.entries    = []
+        # Exact match lookup
+        self.exact      = {}
+        # bigram -> list of entry idxs
+        self.index      = defaultdict(list)
+
+        # Lookup statistics
+        self.n_exact    = 0
+        self.n_fuzzy    = 0
+
+        if os.path.exists(self.filename):
+            self.__read()
+            self.__file = open(self.filename, 'ab')
+        else:
+            self.__file = open(self.filename, 'wb')
+            cPickle.dump(self.header, self.__file, cPickle.HIGHEST_PROTOCOL)
+
+    def __read(self):
+        with open(self.filename, 'rb') as f:
+            header = cPickle.load(f)
+            if header != self.header:
+                raise Exception('Translation memory %s was created with different models: %s' % (self.filename, header))
+
+            while True:
+                try:
+                    src, hyp, score = cPickle.load(f)
+                except (EOFError, cPickle.UnpicklingError):
+                    # A partially written last entry is simply ignored
+                    break
+                self.__index(tuple(src), hyp, score)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __index(self, src, hyp, score):
+        eidx = len(self.entries)
+        self.entries.append((src, hyp, score))
+        self.exact[src] = eidx
+        for gram in bigrams(src):
+            postings = self.index[gram]
+            # One more entry marks it as too common
+            if len(postings) <= self.max_postings:
+                postings.append(eidx)
+
+    def add(self, src, hyp, score):
+        """Add a new entry and append it to the memory file."""
+        src = tuple(src)
+        if src in self.exact:
+            return
+
+        self.__index(src, hyp, score)
+        cPickle.dump((src, hyp, score), self.__file, cPickle.HIGHEST_PROTOCOL)
+
+    def lookup(self, src):
+        """Return the (hyp, score) of the best match above the
+        threshold or None."""
+        src = tuple(src)
+
+        eidx = self.exact.get(src, None)
+        if eidx is not None:
+            self.n_exact += 1
+            return self.entries[eidx][1:]
+
+        if self.threshold >= 1.0:
+            return None
+
+        # Gather candidates sharing the rarest bigrams of the query
+        grams = [g for g in bigrams(src) if len(self.index.get(g, ())) <= self.max_postings]
+        grams.sort(key=lambda g: len(self.index.get(g, ())))
+        counts = defaultdict(int)
+        for gram in grams[:self.max_grams]:
+            for eidx in self.index.get(gram, ()):
+                counts[eidx] += 1
+
+        best, best_score = None, self.threshold
+        cands = sorted(counts.iterkeys(), key=lambda e: -counts[e])[:self.max_cands]
+        for eidx in cands:
+            cand = self.entries[eidx][0]
+            # Cheap upper bound from the length difference
+            maxlen = float(max(len(src), len(cand)))
+            if 1. - abs(len(src) - len(cand)) / maxlen < best_score:
+                continue
+            score = fuzzy_score(src, cand)
+            if score >= best_score:
+                best, best_score = eidx, score
+
+        if best is None:
+            return None
+
+        self.n_fuzzy += 1
+        return self.entries[best][1:]
+
+    def close(self):
+        self.__file.close()
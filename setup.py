@@ -44,6 +44,7 @@ setup(
                     'bin/nmt-train',
                     'bin/nmt-extract',
                     'bin/nmt-translate',
+                    'bin/nmt-rescore',
                     'bin/nmt-build-dict',
                     'bin/nmt-coco-metrics',
                     'bin/nmt-bpe-apply',